@@ -0,0 +1,387 @@
+import argparse
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from configs.fake import fake_solver_configs
+from generator import GEN_MODELS, generate_crossword, get_generator_config
+from helper import get_llm
+from tracing import Tracer, current_job, get_tracer, set_tracer
+from cache import SQLiteCache, set_llm_cache
+from configs.rate_limits import rate_limits
+from ratelimit import set_rate_limits
+from ensemble import DEFAULT_POLICY, DEFAULT_STATS_PATH, SolverStats
+from checkpoint import unfinished_log
+from transcript import TranscriptWriter, current_transcript, set_transcript_recording
+
+load_dotenv()
+
+TRANSCRIPT_FILE = "transcript.jsonl.gz"
+
+# manifest fields a job may leave out
+JOB_DEFAULTS = {
+    "grid_size": 15,
+    "word_count": 10,
+    "difficulty": "medium",
+    "gen_model": "gpt",
+    "iterations": 1,
+}
+
+# generate_crossword arguments every job gets from the runner
+RUNNER_ARGS = {
+    "llm",
+    "grid_size",
+    "word_count",
+    "desired_difficulty",
+    "iterations",
+    "verbose",
+    "model",
+    "solvers",
+    "output_dir",
+    "resume",
+    "overwrite",
+    "solver_stats",
+    "solver_policy",
+}
+
+
+class ThreadOutput:
+    """
+    Replaces sys.stdout so that every print of a job goes to that job's log
+    file, while prints from other threads reach the real stdout. The log is
+    kept in a context variable, so prints of the job's solvers on the
+    solver service loop, which runs them in the job's context, follow it.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.file = ContextVar("job_output", default=None)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def _target(self):
+        return self.file.get() or self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    @contextmanager
+    def redirect(self, file):
+        token = self.file.set(file)
+        try:
+            yield
+        finally:
+            self.file.reset(token)
+
+
+def job_fields():
+    """
+    The fields a manifest job may have: the ones in JOB_DEFAULTS, its id,
+    fake_solvers and the generate_crossword arguments left to the job.
+    """
+    params = set(inspect.signature(generate_crossword).parameters) - RUNNER_ARGS
+    return set(JOB_DEFAULTS) | {"id", "fake_solvers"} | params
+
+
+def load_manifest(path):
+    """
+    Reads the jobs from a JSON list or a JSONL file with one job per line.
+    A job's "count" expands it into that many jobs with numbered ids.
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(entries, dict):
+        entries = [entries]
+
+    jobs = []
+    for i, entry in enumerate(entries):
+        entry = dict(JOB_DEFAULTS, **entry)
+        count = entry.pop("count", 1)
+        job_id = entry.pop("id", f"job-{i}")
+        for n in range(count):
+            jobs.append(dict(entry, id=job_id if count == 1 else f"{job_id}-{n}"))
+    return jobs
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        output_root,
+        max_parallel,
+        verbose=False,
+        resume=False,
+        overwrite=False,
+        solver_stats=None,
+        solver_policy=None,
+        transcripts=False,
+    ):
+        self.output_root = output_root
+        self.max_parallel = max_parallel
+        self.verbose = verbose
+        self.resume = resume
+        self.overwrite = overwrite
+        # shared by every job, so later jobs pick solvers from earlier ones
+        self.solver_stats = solver_stats
+        self.solver_policy = solver_policy
+        # record every job's LLM calls to a transcript in its output directory
+        self.transcripts = transcripts
+        self.output = ThreadOutput(sys.stdout)
+        self._llms = {}
+        self._llms_lock = threading.Lock()
+
+    def shared_llm(self, gen_model):
+        """
+        One PuzzleLLM client per model, shared by every job that uses it.
+        """
+        with self._llms_lock:
+            if gen_model not in self._llms:
+                self._llms[gen_model] = get_llm(get_generator_config(gen_model))
+            return self._llms[gen_model]
+
+    def run_job(self, job):
+        job = dict(job)
+        job_id = job.pop("id")
+        result = {"id": job_id, **job}
+        output_dir = os.path.join(self.output_root, job_id)
+        os.makedirs(output_dir, exist_ok=True)
+
+        token = current_job.set(job_id)
+        transcript = None
+        if self.transcripts:
+            transcript = TranscriptWriter(os.path.join(output_dir, TRANSCRIPT_FILE))
+        transcript_token = current_transcript.set(transcript)
+        started_at = time.perf_counter()
+        with open(os.path.join(output_dir, "log.txt"), "a" if self.resume else "w") as log:
+            with self.output.redirect(log):
+                try:
+                    gen_model = job.pop("gen_model")
+                    solvers = fake_solver_configs if job.pop("fake_solvers", False) else None
+                    crossword = generate_crossword(
+                        self.shared_llm(gen_model),
+                        job.pop("grid_size"),
+                        job.pop("word_count"),
+                        job.pop("difficulty"),
+                        job.pop("iterations"),
+                        self.verbose,
+                        GEN_MODELS[gen_model],
+                        solvers=solvers,
+                        output_dir=output_dir,
+                        resume=self.resume,
+                        overwrite=self.overwrite,
+                        solver_stats=self.solver_stats,
+                        solver_policy=self.solver_policy,
+                        **job,
+                    )
+                    result["status"] = "ok"
+                    result["placed_words"] = len(crossword["words"])
+                except Exception as e:
+                    traceback.print_exc(file=log)
+                    result["status"] = "failed"
+                    result["error"] = f"{type(e).__name__}: {e}"
+
+        result["wall_s"] = time.perf_counter() - started_at
+        result.update(get_tracer().job_totals(job_id))
+        if transcript is not None:
+            transcript.close()
+        current_transcript.reset(transcript_token)
+        current_job.reset(token)
+        return result
+
+    def run(self, jobs):
+        sys.stdout = self.output
+        started_at = time.perf_counter()
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                futures = [executor.submit(self.run_job, job) for job in jobs]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    print(
+                        f"DONE {result['id']}: {result['status']}, "
+                        f"{result.get('placed_words', 0)} word(s), "
+                        f"{result['wall_s']:.1f}s, {result.get('calls', 0)} LLM call(s) "
+                        f"[{len(results)}/{len(jobs)}]"
+                    )
+        finally:
+            sys.stdout = self.output.stream
+        return results, time.perf_counter() - started_at
+
+
+def summarize(results, wall):
+    completed = [result for result in results if result["status"] == "ok"]
+    tokens = sum(
+        result.get("input_tokens", 0) + result.get("output_tokens", 0)
+        for result in completed
+    )
+    return {
+        "jobs": len(results),
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "wall_s": wall,
+        "puzzles_per_hour": len(completed) / wall * 3600 if wall else 0.0,
+        "tokens_per_puzzle": tokens / len(completed) if completed else 0.0,
+        "calls_per_puzzle": (
+            sum(result.get("calls", 0) for result in completed) / len(completed)
+            if completed
+            else 0.0
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate many crossword puzzles concurrently from a manifest"
+    )
+    parser.add_argument(
+        "manifest",
+        help="JSON list or JSONL file of jobs with grid_size, word_count, difficulty and gen_model",
+    )
+    parser.add_argument(
+        "--output_root",
+        default="output/batch",
+        help="Directory holding one output directory per job and the summary",
+    )
+    parser.add_argument(
+        "--max_parallel",
+        type=int,
+        default=4,
+        help="Maximum number of puzzles generated at once",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue every job from the checkpoint log in its output directory",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Start jobs over even if their output directory holds the checkpoint log of an unfinished run",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="JSONL file that every LLM call and grid validation is appended to",
+    )
+    parser.add_argument(
+        "--cache_path",
+        default=None,
+        help="SQLite file used to cache LLM responses (caching is off without it)",
+    )
+    parser.add_argument(
+        "--no_rate_limits",
+        action="store_true",
+        help="Do not throttle LLM calls to the limits in configs/rate_limits.py",
+    )
+    parser.add_argument(
+        "--rate_limit_db",
+        default=None,
+        help="SQLite file that shares the request and token budgets with other processes",
+    )
+    parser.add_argument(
+        "--solver_stats",
+        default=None,
+        help="JSON file that every SolverLLM's latency, token cost and agreement with the others is added to",
+    )
+    parser.add_argument(
+        "--adaptive_solvers",
+        action="store_true",
+        help=f"Only ask the SolverLLMs the stats say are worth their cost (stats default to {DEFAULT_STATS_PATH})",
+    )
+    parser.add_argument(
+        "--target_confidence",
+        type=float,
+        default=DEFAULT_POLICY["target_confidence"],
+    )
+    parser.add_argument(
+        "--solver_cost_budget", type=float, default=DEFAULT_POLICY["max_cost"]
+    )
+    parser.add_argument(
+        "--solver_latency_budget", type=float, default=DEFAULT_POLICY["max_latency_s"]
+    )
+    parser.add_argument("--min_solvers", type=int, default=DEFAULT_POLICY["min_solvers"])
+    parser.add_argument(
+        "--transcripts",
+        action="store_true",
+        help=f"Record every job's prompts and responses to {TRANSCRIPT_FILE} in its output directory, for replay.py",
+    )
+
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    fields = job_fields()
+    for job in jobs:
+        unknown = sorted(set(job) - fields)
+        if unknown:
+            parser.error(f"{job['id']}: unknown field(s) {unknown}")
+        if job["gen_model"] not in GEN_MODELS:
+            parser.error(f"{job['id']}: unknown gen_model {job['gen_model']}")
+        if job["grid_size"] < 10:
+            parser.error(f"{job['id']}: grid_size must be at least 10.")
+        output_dir = os.path.join(args.output_root, job["id"])
+        if not args.resume and not args.overwrite and unfinished_log(output_dir):
+            parser.error(
+                f"{job['id']}: {output_dir} holds the checkpoint log of an unfinished run, "
+                "continue it with --resume or start over with --overwrite."
+            )
+
+    # the tracer also counts the calls and tokens of every job
+    set_tracer(Tracer(args.trace))
+    if args.cache_path:
+        set_llm_cache(SQLiteCache(args.cache_path))
+    # every job's PuzzleLLM and solver calls draw from the same budgets
+    if not args.no_rate_limits:
+        set_rate_limits(rate_limits, args.rate_limit_db)
+    if args.transcripts:
+        set_transcript_recording(True)
+
+    solver_stats = solver_policy = None
+    if args.solver_stats or args.adaptive_solvers:
+        solver_stats = SolverStats(args.solver_stats or DEFAULT_STATS_PATH)
+    if args.adaptive_solvers:
+        solver_policy = {
+            "target_confidence": args.target_confidence,
+            "max_cost": args.solver_cost_budget,
+            "max_latency_s": args.solver_latency_budget,
+            "min_solvers": args.min_solvers,
+        }
+
+    print(f"RUNNING {len(jobs)} job(s), at most {args.max_parallel} at once")
+    runner = BatchRunner(
+        args.output_root,
+        args.max_parallel,
+        args.verbose,
+        args.resume,
+        args.overwrite,
+        solver_stats,
+        solver_policy,
+        args.transcripts,
+    )
+    results, wall = runner.run(jobs)
+
+    summary = summarize(results, wall)
+    print("\nBATCH SUMMARY:")
+    for key, value in summary.items():
+        print(f"{key}: {round(value, 2) if isinstance(value, float) else value}")
+
+    os.makedirs(args.output_root, exist_ok=True)
+    with open(os.path.join(args.output_root, "summary.json"), "w") as f:
+        json.dump({"summary": summary, "jobs": results}, f, indent=4)
+
+    get_tracer().close()
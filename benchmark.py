@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+from configs.fake import fake_generator_config, fake_solver_configs
+from encoders import GRID_ENCODERS
+from ensemble import SolverStats, usage_cost
+from fake_llm import fake_stats, reset_fake_stats
+from generator import generate_crossword
+from helper import get_llm
+from tracing import Tracer, get_tracer, set_tracer
+from wordlist import load_word_index
+
+# fake LLM stages that place words in the grid
+GENERATION_PHASES = ["generate", "generate_candidates"]
+
+# metrics compared against a baseline, all of them "lower is better"
+REGRESSION_METRICS = ["outside_llm_s", "calls_per_word"]
+
+
+def busy_time(intervals):
+    """
+    Length of the union of (start, end) intervals, i.e. the wall time during
+    which at least one LLM call was in flight.
+    """
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def run_case(grid_size, word_count, args, seed, solver_stats=None):
+    generator_config = dict(
+        fake_generator_config,
+        latency=args.latency,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        malformed_rate=args.malformed_rate,
+        seed=seed,
+    )
+    attempt_llms = None
+    if args.parallel_attempts > 1:
+        # differently seeded clients, as a real model would answer differently
+        attempt_llms = [
+            get_llm(dict(generator_config, seed=seed * 1000 + i))
+            for i in range(args.parallel_attempts)
+        ]
+    solvers = [
+        dict(
+            config,
+            latency=args.latency,
+            failure_rate=max(args.failure_rate, config.get("failure_rate", 0)),
+            seed=seed,
+        )
+        for config in fake_solver_configs
+    ]
+
+    reset_fake_stats()
+    # an in-memory tracer, only used for its prompt token counts
+    set_tracer(Tracer())
+    started_at = time.perf_counter()
+    # its own output directory, so the checkpoint log of a real run is kept
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(
+        io.StringIO()
+    ):
+        crossword = generate_crossword(
+            get_llm(generator_config),
+            grid_size,
+            word_count,
+            args.difficulty,
+            args.iterations,
+            False,
+            generator_config["model"],
+            solvers=solvers,
+            solver_batch_size=args.solver_batch_size,
+            candidate_count=args.candidates,
+            max_slots=args.max_slots if args.slot_index else None,
+            grid_format=args.grid_format,
+            stream=args.stream,
+            early_stop=args.early_stop,
+            solver_memo=args.solver_memo,
+            word_index=load_word_index(args.wordlist) if args.wordlist else None,
+            wordlist_solver=args.wordlist_solver,
+            fill_mode=args.fill_mode,
+            attempt_llms=attempt_llms,
+            hedge_percentile=args.hedge_percentile,
+            backtrack_depth=args.backtrack_depth,
+            max_generation_calls=args.max_generation_calls,
+            region_size=args.region_size,
+            solver_stats=solver_stats,
+            structured=args.structured_output,
+            output_dir=output_dir,
+            solver_policy=(
+                {"target_confidence": args.target_confidence}
+                if args.adaptive_solvers
+                else None
+            ),
+        )
+    wall = time.perf_counter() - started_at
+
+    stats = fake_stats()
+    traced = get_tracer().summary()
+    placed = len(crossword["words"])
+    generate_calls = sum(stats["calls"].get(phase, 0) for phase in GENERATION_PHASES)
+    if args.fill_mode == "wordlist":
+        # the grid is filled locally and its clues take a single call
+        generate_calls += 1
+    return {
+        "wall_s": wall,
+        "llm_calls": sum(stats["calls"].values()),
+        "generate_calls": generate_calls,
+        "placed_words": placed,
+        "calls_per_word": generate_calls / placed if placed else float("inf"),
+        "retries": max(generate_calls - placed, 0),
+        "outside_llm_s": wall - busy_time(stats["intervals"]),
+        "output_chars": stats["output_chars"],
+        "prompt_tokens_per_call": (
+            sum(row["input_tokens"] for row in traced)
+            / max(1, sum(row["calls"] for row in traced))
+        ),
+        "parse_failure_rate": (
+            sum(row["parse_failures"] for row in traced)
+            / max(1, sum(row["calls"] for row in traced))
+        ),
+        "solver_cost": sum(
+            usage_cost(row["model"], row) for row in traced if row["phase"] == "solve"
+        ),
+    }
+
+
+def summarize(runs):
+    return {metric: statistics.mean(run[metric] for run in runs) for metric in runs[0]}
+
+
+def print_table(results):
+    columns = ["grid_size", "word_count"] + list(results[0]["metrics"])
+    print(" | ".join(f"{column:>14}" for column in columns))
+    for result in results:
+        values = [result["grid_size"], result["word_count"]]
+        values += [round(value, 4) for value in result["metrics"].values()]
+        print(" | ".join(f"{value:>14}" for value in values))
+
+
+def find_regressions(results, baseline, tolerance):
+    previous = {(r["grid_size"], r["word_count"]): r["metrics"] for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["grid_size"], result["word_count"]))
+        if not before:
+            continue
+        for metric in REGRESSION_METRICS:
+            if result["metrics"][metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"grid_size={result['grid_size']} word_count={result['word_count']} "
+                    f"{metric}: {before[metric]:.4f} -> {result['metrics'][metric]:.4f}"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crossword pipeline against the offline fake LLMs"
+    )
+    parser.add_argument("--grid_sizes", type=int, nargs="+", default=[10, 15, 20])
+    parser.add_argument("--word_counts", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument(
+        "--difficulty", choices=["easy", "medium", "hard"], default="medium"
+    )
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--solver_batch_size", type=int, default=1)
+    parser.add_argument("--candidates", type=int, default=1)
+    parser.add_argument("--slot_index", action="store_true")
+    parser.add_argument("--max_slots", type=int, default=0)
+    parser.add_argument("--grid_format", choices=list(GRID_ENCODERS), default="dicts")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--early_stop", action="store_true")
+    parser.add_argument("--solver_memo", action="store_true")
+    parser.add_argument("--wordlist", default=None)
+    parser.add_argument("--wordlist_solver", action="store_true")
+    parser.add_argument("--fill_mode", choices=["llm", "wordlist"], default="llm")
+    parser.add_argument("--parallel_attempts", type=int, default=1)
+    parser.add_argument("--hedge_percentile", type=float, default=None)
+    parser.add_argument("--backtrack_depth", type=int, default=0)
+    parser.add_argument("--region_size", type=int, default=None)
+    parser.add_argument("--max_generation_calls", type=int, default=None)
+    parser.add_argument(
+        "--adaptive_solvers",
+        action="store_true",
+        help="Pick the solvers from stats kept across every run of the benchmark",
+    )
+    parser.add_argument("--target_confidence", type=float, default=0.9)
+    parser.add_argument(
+        "--structured_output",
+        action="store_true",
+        help="Ask for tool calls following the structured.py schemas",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="Runs averaged per configuration"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Injected seconds per LLM call"
+    )
+    parser.add_argument(
+        "--slow_rate",
+        type=float,
+        default=0.0,
+        help="Probability that an LLM call takes --slow_latency seconds longer",
+    )
+    parser.add_argument("--slow_latency", type=float, default=0.0)
+    parser.add_argument(
+        "--failure_rate",
+        type=float,
+        default=0.0,
+        help="Probability that a SolverLLM call raises",
+    )
+    parser.add_argument(
+        "--malformed_rate",
+        type=float,
+        default=0.0,
+        help="Probability that the PuzzleLLM replies without JSON",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Fail if results regress against this results file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown against the baseline",
+    )
+
+    args = parser.parse_args()
+
+    # kept in memory across every run of the benchmark
+    solver_stats = SolverStats(None) if args.adaptive_solvers else None
+
+    results = []
+    for grid_size in args.grid_sizes:
+        for word_count in args.word_counts:
+            runs = [
+                run_case(grid_size, word_count, args, args.seed + repeat, solver_stats)
+                for repeat in range(args.repeats)
+            ]
+            results.append(
+                {
+                    "grid_size": grid_size,
+                    "word_count": word_count,
+                    "metrics": summarize(runs),
+                }
+            )
+
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
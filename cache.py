@@ -0,0 +1,283 @@
+import hashlib
+from abc import ABC, abstractmethod
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# client settings that do not change what the model answers
+IGNORED_CONFIG_FIELDS = ("timeout", "max_retries")
+
+
+def render_messages(messages):
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    if isinstance(messages, str):
+        return [["human", messages]]
+    return [[message.type, message.content] for message in messages]
+
+
+def cache_key(config, messages, schema=None):
+    payload = {
+        "config": {
+            k: v for k, v in config.items() if k not in IGNORED_CONFIG_FIELDS
+        },
+        "messages": render_messages(messages),
+    }
+    if schema is not None:
+        # a structured response is only reused for requests for the same schema
+        payload["schema"] = schema.__name__
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class BaseCache(ABC):
+    @abstractmethod
+    def lookup(self, key):
+        pass
+
+    @abstractmethod
+    def update(self, key, value):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class InMemoryCache(BaseCache):
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            created_at, value = self._entries[key]
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def update(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(BaseCache):
+    """
+    On-disk cache. Entries expire after ttl seconds and the least recently
+    used ones are evicted once max_entries or max_bytes is exceeded.
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at)"
+        )
+        self._conn.commit()
+
+    def lookup(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(value)
+
+    def update(self, key, value):
+        now = time.time()
+        serialized = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)
+            )
+
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+        if self.max_bytes is not None:
+            (total,) = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+            )
+            stale = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+class CachedLLM:
+    """
+    Wraps a chat model so identical requests (same model config and
+    rendered messages) are answered from the cache. Responses are only
+    cached once the caller has read and validated them and passes them to
+    remember (see remember_response), so a retry of a request whose answer
+    was rejected reaches the model again instead of the cached bad answer.
+    """
+
+    def __init__(self, llm, config, cache, deterministic_only=False):
+        self.llm = llm
+        self.config = config
+        self.cache = cache
+        self.deterministic_only = deterministic_only
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def cacheable(self):
+        return not self.deterministic_only or self.config.get("temperature") == 0
+
+    def _lookup(self, input, schema=None):
+        value = self.cache.lookup(cache_key(self.config, input, schema))
+        if value is None:
+            return None
+        # imported on the first hit, as chat_prompt() does, to keep start-up fast
+        from langchain_core.messages import AIMessage
+
+        response_metadata = dict(value.get("response_metadata", {}), cache_hit=True)
+        return AIMessage(content=value["content"], response_metadata=response_metadata)
+
+    def invoke(self, input, *args, **kwargs):
+        cached = self._lookup(input, kwargs.get("schema")) if self.cacheable() else None
+        if cached is not None:
+            return cached
+        return self.llm.invoke(input, *args, **kwargs)
+
+    async def ainvoke(self, input, *args, **kwargs):
+        cached = self._lookup(input, kwargs.get("schema")) if self.cacheable() else None
+        if cached is not None:
+            return cached
+        return await self.llm.ainvoke(input, *args, **kwargs)
+
+    def remember(self, input, response, schema=None):
+        """
+        Caches the response to input once the caller has accepted it.
+        """
+        if self.cacheable():
+            self.cache.update(
+                cache_key(self.config, input, schema),
+                {
+                    "content": response.content,
+                    "response_metadata": response.response_metadata,
+                },
+            )
+
+    def _cached_chunk(self, cached):
+        from langchain_core.messages import AIMessageChunk
+
+        return AIMessageChunk(
+            content=cached.content, response_metadata=cached.response_metadata
+        )
+
+    def stream(self, input, *args, **kwargs):
+        cached = self._lookup(input) if self.cacheable() else None
+        if cached is not None:
+            yield self._cached_chunk(cached)
+            return
+        yield from self.llm.stream(input, *args, **kwargs)
+
+    async def astream(self, input, *args, **kwargs):
+        cached = self._lookup(input) if self.cacheable() else None
+        if cached is not None:
+            yield self._cached_chunk(cached)
+            return
+        async for chunk in self.llm.astream(input, *args, **kwargs):
+            yield chunk
+
+
+def remember_response(llm, input, response, schema=None):
+    """
+    Caches a response the caller parsed and validated, when llm is cached.
+    Responses that came from the cache are not written again.
+    """
+    remember = getattr(llm, "remember", None)
+    if remember and not response.response_metadata.get("cache_hit"):
+        remember(input, response, schema)
+
+
+_llm_cache = None
+_deterministic_only = False
+
+
+def set_llm_cache(cache, deterministic_only=False):
+    global _llm_cache, _deterministic_only
+    _llm_cache = cache
+    _deterministic_only = deterministic_only
+
+
+def get_llm_cache():
+    return _llm_cache
+
+
+def wrap_with_cache(llm, config):
+    if _llm_cache is None:
+        return llm
+    return CachedLLM(llm, config, _llm_cache, _deterministic_only)
@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+from collections import defaultdict
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+# run settings a resumed run has to match
+RUN_FIELDS = ["grid_size", "word_count", "desired_difficulty", "fill_mode"]
+
+
+class CheckpointMismatch(Exception):
+    pass
+
+
+class UnfinishedCheckpoint(Exception):
+    pass
+
+
+def unfinished_log(output_dir):
+    """
+    Whether output_dir holds the log of a run that did not finish.
+    """
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                if json.loads(line)["type"] == "done":
+                    return False
+            except (json.JSONDecodeError, KeyError, TypeError):
+                pass
+    return True
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of the steps of a generate_crossword run, written
+    to its output directory as they complete: every accepted word and every
+    backtrack, the end of generation, every clue a solver guesses, every
+    finished solver and every finished iteration. Resuming reads the log
+    back so the completed steps are not sent to an LLM again. The log of a
+    run that did not finish is only replaced with overwrite.
+    """
+
+    def __init__(self, output_dir, resume=False, overwrite=False):
+        self.path = os.path.join(output_dir, CHECKPOINT_FILE)
+        if not resume and not overwrite and unfinished_log(output_dir):
+            raise UnfinishedCheckpoint(
+                f"{self.path} holds an unfinished run, resume or overwrite it"
+            )
+        self.records = self._load() if resume else []
+        self.iteration = 0
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._file = open(self.path, "a" if resume else "w")
+
+    def _load(self):
+        """
+        Reads the complete records of the log and truncates it after the
+        last of them, so records appended on resume do not land on the end
+        of a line torn when the run died.
+        """
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # the line being written when the run died
+                    break
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                end += len(line)
+        os.truncate(self.path, end)
+        return records
+
+    def record(self, record_type, **fields):
+        with self._lock:
+            self._file.write(json.dumps({"type": record_type, **fields}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def _of_type(self, record_type):
+        return [record for record in self.records if record["type"] == record_type]
+
+    def start(self, **run):
+        """
+        Records the run settings, or checks them against the resumed log.
+        """
+        previous = self._of_type("run")
+        if not previous:
+            self.record("run", **run)
+            return
+        for field in RUN_FIELDS:
+            if previous[0].get(field) != run.get(field):
+                raise CheckpointMismatch(
+                    f"{self.path} was written with {field}={previous[0].get(field)}, "
+                    f"not {run.get(field)}"
+                )
+
+    def word(self, word_d, calls=0):
+        self.record("word", word=word_d, calls=calls)
+
+    def undo(self, avoid_key, calls=0, depth=0):
+        self.record("undo", avoid=list(avoid_key), calls=calls, depth=depth)
+
+    def placed_words(self):
+        """
+        Replays the word and undo records into the state generate searched
+        from: (placed words, fullest placement reached, placements
+        backtracked out of, generation calls spent, backtrack depth).
+        """
+        words = []
+        best = []
+        avoid = set()
+        calls = 0
+        depth = 0
+        for record in self.records:
+            if record["type"] == "word":
+                words.append(record["word"])
+                if len(words) > len(best):
+                    best = list(words)
+                    depth = 0
+            elif record["type"] == "undo":
+                words.pop()
+                if "avoid" in record:
+                    avoid.add(tuple(record["avoid"]))
+                depth = record.get("depth", depth)
+            else:
+                continue
+            calls = record.get("calls", calls)
+        return words, best, avoid, calls, depth
+
+    def generated(self, crossword=None):
+        """
+        Records the generated crossword, or returns the recorded one.
+        """
+        if crossword is not None:
+            self.record("generated", crossword=crossword)
+            return crossword
+        records = self._of_type("generated")
+        return records[-1]["crossword"] if records else None
+
+    def solver_selection(self, models=None):
+        """
+        Records the solver models picked for the run, or returns the
+        recorded ones, so a resumed run asks the same solvers.
+        """
+        if models is not None:
+            self.record("solver_selection", models=models)
+            return models
+        records = self._of_type("solver_selection")
+        return records[-1]["models"] if records else None
+
+    def solver_guess(self, model, clue_key, word):
+        self.record(
+            "solver_guess", iteration=self.iteration, model=model, clue=clue_key, word=word
+        )
+
+    def solver_guesses(self, iteration):
+        """
+        The recorded guesses per solver model, as memos keyed like
+        solver.clue_key.
+        """
+        memos = defaultdict(dict)
+        for record in self._of_type("solver_guess"):
+            if record["iteration"] == iteration:
+                memos[record["model"]][tuple(record["clue"])] = record["word"]
+        return memos
+
+    def solver_done(self, model, response):
+        self.record("solver", iteration=self.iteration, model=model, response=response)
+
+    def solver_responses(self, iteration):
+        return {
+            record["model"]: record["response"]
+            for record in self._of_type("solver")
+            if record["iteration"] == iteration
+        }
+
+    def iteration_done(self, crossword, clue_update_words, finished):
+        self.record(
+            "iteration",
+            iteration=self.iteration,
+            crossword=crossword,
+            clue_update_words=clue_update_words,
+            finished=finished,
+        )
+
+    def finish(self):
+        self.record("done")
+
+    def last_iteration(self):
+        records = self._of_type("iteration")
+        return records[-1] if records else None
@@ -0,0 +1,106 @@
+fake_lexicon = {
+    "apple": "A fruit that keeps the doctor away.",
+    "arrow": "Projectile shot from a bow.",
+    "badge": "Emblem worn to show membership.",
+    "baker": "Person who makes bread.",
+    "beach": "Sandy shore by the sea.",
+    "bee": "Insect that makes honey.",
+    "bread": "Staple food made from flour and yeast.",
+    "bridge": "Structure built to cross a river.",
+    "cactus": "Spiny desert plant.",
+    "camel": "Desert animal with humps.",
+    "candle": "Wax stick with a wick.",
+    "canoe": "Narrow boat moved with paddles.",
+    "castle": "Fortified medieval residence.",
+    "cat": "Feline house pet.",
+    "cello": "Large bowed string instrument.",
+    "chess": "Board game with kings and pawns.",
+    "cloud": "White mass floating in the sky.",
+    "comet": "Icy body with a glowing tail.",
+    "coral": "Reef-building sea organism.",
+    "desert": "Dry, sandy region.",
+    "dog": "Loyal canine companion.",
+    "dragon": "Fire-breathing mythical creature.",
+    "drum": "Percussion instrument that is struck.",
+    "eagle": "Large bird of prey.",
+    "earth": "Third planet from the sun.",
+    "elbow": "Joint in the middle of the arm.",
+    "fern": "Leafy plant that reproduces by spores.",
+    "flute": "Woodwind instrument played sideways.",
+    "forest": "Large area covered by trees.",
+    "fox": "Cunning animal with a bushy tail.",
+    "galaxy": "System of billions of stars.",
+    "garden": "Plot where flowers are grown.",
+    "ginger": "Spicy root used in cooking.",
+    "glacier": "Slowly moving mass of ice.",
+    "guitar": "Six-stringed instrument.",
+    "hammer": "Tool for driving nails.",
+    "harbor": "Sheltered place where ships dock.",
+    "honey": "Sweet substance made by bees.",
+    "iceberg": "Floating mass of ice.",
+    "island": "Land surrounded by water.",
+    "ivory": "Material from elephant tusks.",
+    "jacket": "Short coat.",
+    "jungle": "Dense tropical forest.",
+    "kettle": "Pot for boiling water.",
+    "kite": "Toy flown in the wind on a string.",
+    "knight": "Armored medieval warrior.",
+    "lemon": "Sour yellow citrus fruit.",
+    "library": "Building full of books to borrow.",
+    "lion": "King of the jungle.",
+    "magnet": "Object that attracts iron.",
+    "maple": "Tree whose sap makes syrup.",
+    "meadow": "Grassy field.",
+    "mirror": "Reflective glass surface.",
+    "moon": "Earth's natural satellite.",
+    "nest": "Home built by a bird.",
+    "ocean": "Vast body of salt water.",
+    "olive": "Small fruit pressed for oil.",
+    "orbit": "Path of a satellite around a planet.",
+    "owl": "Nocturnal bird that hoots.",
+    "palace": "Official residence of a monarch.",
+    "panda": "Black and white bear that eats bamboo.",
+    "pencil": "Writing tool with graphite.",
+    "piano": "Keyboard instrument with hammers.",
+    "pirate": "Seafaring robber.",
+    "planet": "Body that orbits a star.",
+    "quartz": "Common crystalline mineral.",
+    "rabbit": "Long-eared hopping animal.",
+    "river": "Flowing body of fresh water.",
+    "robot": "Programmable machine.",
+    "saddle": "Seat for a horse rider.",
+    "salmon": "Fish that swims upstream to spawn.",
+    "star": "Luminous ball of gas in the night sky.",
+    "sugar": "Sweet crystalline substance.",
+    "sun": "Star at the center of our solar system.",
+    "tiger": "Striped big cat.",
+    "tomato": "Red fruit often used as a vegetable.",
+    "tulip": "Spring flower associated with Holland.",
+    "umbrella": "Shelter carried in the rain.",
+    "violin": "Bowed string instrument held under the chin.",
+    "volcano": "Mountain that erupts lava.",
+    "wagon": "Four-wheeled cart.",
+    "walnut": "Wrinkled edible nut.",
+    "whale": "Largest marine mammal.",
+    "window": "Glass opening in a wall.",
+    "wizard": "Man who practices magic.",
+    "yacht": "Luxury sailing boat.",
+    "zebra": "Striped African horse.",
+}
+
+fake_generator_config = {
+    "model": "fake-generator",
+    "temperature": 1,
+    "max_tokens": 4096,
+    "timeout": None,
+    "max_retries": 4,
+}
+
+fake_solver_configs = [
+    {"model": "fake-solver-strong", "temperature": 1, "accuracy": 0.95},
+    {"model": "fake-solver-good", "temperature": 1, "accuracy": 0.8},
+    {"model": "fake-solver-average", "temperature": 1, "accuracy": 0.6},
+    {"model": "fake-solver-weak", "temperature": 1, "accuracy": 0.4},
+    {"model": "fake-solver-flaky", "temperature": 1, "accuracy": 0.7, "failure_rate": 0.1},
+    {"model": "fake-solver-sloppy", "temperature": 1, "accuracy": 0.7, "malformed_rate": 0.2},
+]
@@ -0,0 +1,18 @@
+# USD per million (input, output) tokens, used to compare solver costs.
+# Check these against the providers' current price lists.
+token_prices = {
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "claude-3-5-sonnet-latest": (3.0, 15.0),
+    "claude-3-5-haiku-latest": (0.8, 4.0),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+    "wordlist": (0.0, 0.0),
+    # offline fakes, priced roughly like the models they stand in for
+    "fake-solver-strong": (3.0, 15.0),
+    "fake-solver-good": (1.0, 4.0),
+    "fake-solver-average": (0.5, 1.5),
+    "fake-solver-weak": (0.1, 0.3),
+    "fake-solver-flaky": (0.3, 0.6),
+    "fake-solver-sloppy": (0.2, 0.4),
+}
@@ -0,0 +1,24 @@
+# RateLimiter settings per provider, or per model to override its provider.
+# Keep these a little under the account's published limits.
+rate_limits = {
+    "openai": {
+        "requests_per_min": 500,
+        "tokens_per_min": 30000,
+        "max_in_flight": 16,
+    },
+    "anthropic": {
+        "requests_per_min": 50,
+        "tokens_per_min": 40000,
+        "max_in_flight": 8,
+    },
+    "groq": {
+        "requests_per_min": 30,
+        "tokens_per_min": 6000,
+        "max_in_flight": 4,
+    },
+    "llama-3.3-70b-versatile": {
+        "requests_per_min": 30,
+        "tokens_per_min": 12000,
+        "max_in_flight": 4,
+    },
+}
@@ -0,0 +1,96 @@
+from grid import Grid
+
+# the grid used in the SAMPLE INPUT of the prompt templates
+SAMPLE_GRID_SIZE = 10
+SAMPLE_WORDS = [
+    {"word": "apple", "row": 0, "column": 1, "isAcross": True},
+    {"word": "planet", "row": 0, "column": 2, "isAcross": False},
+]
+
+
+def encode_dicts(grid):
+    return str(grid.char_positions)
+
+
+def encode_ascii(grid):
+    return "\n".join(
+        "".join(char or "." for char in grid.cells[i * grid.grid_size : (i + 1) * grid.grid_size])
+        for i in range(grid.grid_size)
+    )
+
+
+def encode_runs(grid):
+    lines = []
+    for i in range(grid.grid_size):
+        row = grid.cells[i * grid.grid_size : (i + 1) * grid.grid_size]
+        if not any(row):
+            continue
+        runs = []
+        empty = 0
+        for char in row:
+            if char is None:
+                empty += 1
+                continue
+            if empty:
+                runs.append(str(empty))
+                empty = 0
+            if runs and not runs[-1].isdigit():
+                runs[-1] += char
+            else:
+                runs.append(char)
+        lines.append(f"{i}: {' '.join(runs)}")
+    return "\n".join(lines) or "(empty)"
+
+
+def encode_words(grid):
+    return (
+        "\n".join(
+            f"{word_d['word']}@({word_d['row']},{word_d['column']},"
+            f"{'across' if word_d['isAcross'] else 'down'})"
+            for word_d in grid.entries
+        )
+        or "(empty)"
+    )
+
+
+# name -> (encoder, description of the format used in the prompt templates)
+GRID_ENCODERS = {
+    "dicts": (
+        encode_dicts,
+        "a list with one entry per filled cell giving its row, column and character",
+    ),
+    "ascii": (
+        encode_ascii,
+        "one line per row from row 0 to row N-1, where the i'th character of a line "
+        "is the character at column i and '.' marks an empty cell",
+    ),
+    "runs": (
+        encode_runs,
+        "one line per row that has characters, written as 'row: runs' where the runs "
+        "cover the row from column 0, a number is that many empty cells and letters "
+        "are filled cells; trailing empty cells are left out",
+    ),
+    "words": (
+        encode_words,
+        "one line per word as word@(row,column,direction), whose characters fill "
+        "consecutive cells from that start cell, to the right when across and "
+        "downward when down",
+    ),
+}
+
+
+def encode_grid(grid, grid_format="dicts"):
+    encoder, _ = GRID_ENCODERS[grid_format]
+    return encoder(grid)
+
+
+def apply_grid_format(template, grid_format="dicts"):
+    """
+    Fills the grid-format placeholders of a prompt template with the
+    description and sample input of the given encoding.
+    """
+    _, description = GRID_ENCODERS[grid_format]
+    sample = Grid.from_json({"words": SAMPLE_WORDS}, SAMPLE_GRID_SIZE)
+    return template.replace("<GRID_FORMAT>", description).replace(
+        "<SAMPLE_CHAR_POSITIONS>", encode_grid(sample, grid_format)
+    )
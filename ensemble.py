@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+from collections import Counter
+from itertools import combinations
+from configs.prices import token_prices
+
+DEFAULT_STATS_PATH = "solver_stats.json"
+
+# runs a solver always gets before the policy may leave it out
+MIN_RUNS = 3
+# a left out solver is run again after this many puzzles without it
+EXPLORE_EVERY = 20
+# words two solvers have to agree on before they predict a third
+MIN_PAIR_VOTES = 20
+# USD per million (input, output) tokens of models missing from the price list
+DEFAULT_PRICE = (1.0, 1.0)
+
+# solver selection settings and their defaults
+DEFAULT_POLICY = {
+    "target_confidence": 0.9,
+    "max_cost": None,
+    "max_latency_s": None,
+    "min_solvers": 2,
+}
+
+
+def usage_cost(model, usage):
+    input_price, output_price = token_prices.get(model, DEFAULT_PRICE)
+    return (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("output_tokens", 0) * output_price
+    ) / 1e6
+
+
+def solver_votes(response):
+    """
+    word -> whether the solver solved it.
+    """
+    votes = {word: False for word in response["unsolved"]}
+    votes.update({word: True for word in response["solved"]})
+    return votes
+
+
+def consensus_votes(responses):
+    """
+    word -> whether most of the solvers solved it, the same majority that
+    get_word_perc's percentages describe.
+    """
+    solved = Counter(word for response in responses for word in response["solved"])
+    words = {word for response in responses for word in solver_votes(response)}
+    return {word: solved[word] > len(responses) / 2 for word in words}
+
+
+class SolverStats:
+    """
+    History of every solver model, persisted as JSON: runs, latency, token
+    cost, how often its votes matched the ensemble consensus and, for every
+    pair of other solvers, how often its vote matched theirs when they
+    agreed. select() uses it to leave out solvers that add cost or latency
+    but little information. Without a path the stats are only kept in
+    memory.
+    """
+
+    def __init__(self, path=DEFAULT_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.models = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.models = json.load(f)
+
+    def _model(self, model):
+        return self.models.setdefault(
+            model,
+            {
+                "runs": 0,
+                "latency_s": 0.0,
+                "cost": 0.0,
+                "votes": 0,
+                "consensus": 0,
+                "skipped": 0,
+                "pairs": {},
+            },
+        )
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.models, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def record(self, responses):
+        """
+        Adds the solver responses of one iteration, each carrying the model,
+        latency_s and usage that asolve_wrapper attaches.
+        """
+        responses = [response for response in responses if "model" in response]
+        if not responses:
+            return
+        consensus = consensus_votes(responses)
+        votes = {response["model"]: solver_votes(response) for response in responses}
+
+        with self._lock:
+            for response in responses:
+                model = response["model"]
+                stats = self._model(model)
+                stats["runs"] += 1
+                stats["latency_s"] += response.get("latency_s", 0.0)
+                stats["cost"] += usage_cost(model, response.get("usage", {}))
+                for word, vote in votes[model].items():
+                    stats["votes"] += 1
+                    stats["consensus"] += vote == consensus[word]
+
+                others = sorted(other for other in votes if other != model)
+                for a, b in combinations(others, 2):
+                    pair = stats["pairs"].setdefault(
+                        f"{a}|{b}", {"votes": 0, "predicted": 0}
+                    )
+                    for word, vote in votes[model].items():
+                        if word not in votes[a] or word not in votes[b]:
+                            continue
+                        if votes[a][word] != votes[b][word]:
+                            continue
+                        pair["votes"] += 1
+                        pair["predicted"] += votes[a][word] == vote
+            self._save()
+
+    def record_selection(self, selected, left_out):
+        with self._lock:
+            for model in selected:
+                self._model(model)["skipped"] = 0
+            for model in left_out:
+                self._model(model)["skipped"] += 1
+            self._save()
+
+    def mean(self, model, field):
+        stats = self.models.get(model)
+        if not stats or not stats["runs"]:
+            return 0.0
+        return stats[field] / stats["runs"]
+
+    def agreement(self, model):
+        stats = self.models.get(model)
+        if not stats or not stats["votes"]:
+            return 0.0
+        return stats["consensus"] / stats["votes"]
+
+    def predicted(self, model, a, b):
+        """
+        Share of the model's votes that matched a and b on the words they
+        agreed on.
+        """
+        pairs = self.models.get(model, {}).get("pairs", {})
+        pair = pairs.get("|".join(sorted([a, b])))
+        if not pair or pair["votes"] < MIN_PAIR_VOTES:
+            return 0.0
+        return pair["predicted"] / pair["votes"]
+
+    def select(
+        self,
+        configs,
+        target_confidence=0.9,
+        max_cost=None,
+        max_latency_s=None,
+        min_solvers=2,
+    ):
+        """
+        Picks the solvers for a puzzle. Solvers with fewer than MIN_RUNS
+        runs, or left out for EXPLORE_EVERY puzzles, always run; the others
+        are considered from cheapest to most expensive and left out when
+        two solvers already picked predict at least target_confidence of
+        their votes, when their mean latency is over max_latency_s, or when
+        their mean cost would take the picked solvers over max_cost. At
+        least min_solvers run, topped up by agreement with the consensus.
+
+        Returns (picked configs, {left out model: reason}).
+        """
+        picked = []
+        candidates = []
+        for config in configs:
+            stats = self.models.get(config["model"])
+            if (
+                not stats
+                or stats["runs"] < MIN_RUNS
+                or stats["skipped"] >= EXPLORE_EVERY
+            ):
+                picked.append(config)
+            else:
+                candidates.append(config)
+
+        left_out = {}
+        candidates.sort(key=lambda config: self.mean(config["model"], "cost"))
+        for config in candidates:
+            model = config["model"]
+            cost = sum(self.mean(c["model"], "cost") for c in picked + [config])
+            predictors = [
+                (a["model"], b["model"])
+                for a, b in combinations(picked, 2)
+                if self.predicted(model, a["model"], b["model"]) >= target_confidence
+            ]
+            if max_latency_s is not None and self.mean(model, "latency_s") > max_latency_s:
+                left_out[model] = f"mean latency {self.mean(model, 'latency_s'):.2f}s"
+            elif max_cost is not None and cost > max_cost:
+                left_out[model] = f"cost budget, ${self.mean(model, 'cost'):.4f} per run"
+            elif predictors:
+                left_out[model] = f"predicted by {predictors[0][0]} and {predictors[0][1]}"
+            else:
+                picked.append(config)
+
+        for config in sorted(
+            (config for config in configs if config["model"] in left_out),
+            key=lambda config: -self.agreement(config["model"]),
+        ):
+            if len(picked) >= min_solvers:
+                break
+            picked.append(config)
+            del left_out[config["model"]]
+
+        picked_models = {config["model"] for config in picked}
+        return [config for config in configs if config["model"] in picked_models], left_out
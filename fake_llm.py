@@ -0,0 +1,400 @@
+import ast
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from configs.fake import fake_lexicon
+
+# the system prompt tells the fake which stage of the pipeline is calling it
+PHASE_MARKERS = [
+    ("crossword puzzle solver answering several clues", "batch_solve"),
+    ("crossword puzzle generator assistant proposing ranked", "generate_candidates"),
+    ("crossword puzzle generator", "generate"),
+    ("crossword puzzle solver", "solve"),
+    ("crossword puzzle creator", "clue"),
+]
+
+# clue -> answer for every clue a fake model has written, shared so that
+# fake solvers can recognise clues written by the fake generator
+CLUE_BOOK = {clue: word for word, clue in fake_lexicon.items()}
+
+_stats_lock = threading.Lock()
+_stats = {"calls": {}, "failures": 0, "intervals": [], "output_chars": 0}
+
+
+class FakeLLMError(Exception):
+    def __init__(self, model):
+        self.model = model
+        super().__init__(f"FAKE FAILURE - Model: {model}")
+
+
+class FakeRateLimitError(FakeLLMError):
+    status_code = 429
+
+
+def reset_fake_stats():
+    with _stats_lock:
+        _stats["calls"] = {}
+        _stats["failures"] = 0
+        _stats["intervals"] = []
+        _stats["output_chars"] = 0
+
+
+def fake_stats():
+    with _stats_lock:
+        return {
+            "calls": dict(_stats["calls"]),
+            "failures": _stats["failures"],
+            "intervals": list(_stats["intervals"]),
+            "output_chars": _stats["output_chars"],
+        }
+
+
+def _record_call(phase, started_at, failed, output_chars=0):
+    with _stats_lock:
+        _stats["calls"][phase] = _stats["calls"].get(phase, 0) + 1
+        _stats["failures"] += 1 if failed else 0
+        _stats["output_chars"] += output_chars
+        _stats["intervals"].append((started_at, time.perf_counter()))
+
+
+def _field(text, name, default=None):
+    """
+    Reads a python literal written as name=<literal> in a human message.
+    """
+    match = re.search(rf"(?:^|\n){name}\s*[=:]\s*\n?(.*?)(?:\n\n|$)", text, re.S)
+    if not match:
+        return default
+    try:
+        return ast.literal_eval(match.group(1).strip())
+    except (ValueError, SyntaxError):
+        return match.group(1).strip()
+
+
+def _slots(text):
+    slots = []
+    for row, column, direction, lengths, pattern in re.findall(
+        r"\((\d+),(\d+),(across|down),len ([\d,-]+),pattern ([^)]+)\)", text or ""
+    ):
+        allowed = set()
+        for part in lengths.split(","):
+            low, _, high = part.partition("-")
+            allowed.update(range(int(low), int(high or low) + 1))
+        slots.append((int(row), int(column), direction == "across", allowed, pattern))
+    return slots
+
+
+def _fits(word, slot):
+    _, _, _, allowed, pattern = slot
+    return len(word) in allowed and all(
+        fixed in ("?", char) for fixed, char in zip(pattern, word)
+    )
+
+
+def _positions(word, row, column, is_across):
+    return ", ".join(
+        f"({char}, {row + (0 if is_across else i)}, {column + (i if is_across else 0)})"
+        for i, char in enumerate(word)
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for the provider chat models.
+
+    Replies come from `responses` (first key contained in the prompt wins),
+    then from `script` (cycled in order), and otherwise are simulated from
+    the fake lexicon for whichever pipeline stage the prompt belongs to.
+    """
+
+    model: str = "fake"
+    temperature: float = 1
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+    max_retries: int = 0
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    failure_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    malformed_rate: float = 0.0
+    accuracy: float = 1.0
+    seed: Optional[int] = None
+    stream_chunk_size: int = 8
+    responses: dict = {}
+    script: list = []
+
+    _rng: Any = PrivateAttr(default=None)
+    _script_index: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context):
+        seed = None if self.seed is None else f"{self.seed}:{self.model}"
+        self._rng = random.Random(seed)
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _delay(self):
+        delay = self.latency + self._rng.uniform(-1, 1) * self.latency_jitter
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            # a tail-latency call
+            delay += self.slow_latency
+        return max(0.0, delay)
+
+    def _respond(self, messages, structured=False):
+        system = " ".join(m.content for m in messages if m.type == "system")
+        human = "\n\n".join(m.content for m in messages if m.type == "human")
+        prompt = system + "\n\n" + human
+
+        for key, response in self.responses.items():
+            if key in prompt:
+                return self._phase(system), response
+        if self.script:
+            response = self.script[self._script_index % len(self.script)]
+            self._script_index += 1
+            return self._phase(system), response
+
+        phase = self._phase(system)
+        # a tool call always carries well-formed arguments
+        if self._rng.random() < self.malformed_rate and not structured:
+            return phase, "I think the answer is probably this one, but I lost track."
+        if phase == "generate":
+            return phase, self._generate_word(human)
+        if phase == "generate_candidates":
+            return phase, self._generate_candidates(human)
+        if phase == "solve":
+            return phase, self._solve_clue(human)
+        if phase == "batch_solve":
+            return phase, self._solve_clues(human)
+        if phase == "clue":
+            return phase, self._update_clues(human)
+        return phase, "{}"
+
+    def _phase(self, system):
+        lowered = system.lower()
+        for marker, phase in PHASE_MARKERS:
+            if marker in lowered:
+                return phase
+        return "unknown"
+
+    def _placements(self, human, count):
+        grid_size = int(_field(human, "grid_size", 10))
+        used = set(_field(human, "words", []) or [])
+        choices = [
+            word
+            for word in sorted(fake_lexicon)
+            if word not in used and len(word) <= grid_size
+        ]
+
+        placements = []
+        slots = _slots(_field(human, "open_slots", ""))
+        self._rng.shuffle(slots)
+        for slot in slots:
+            matches = [word for word in choices if _fits(word, slot)]
+            if len(placements) == count or not matches:
+                continue
+            word = self._rng.choice(matches)
+            choices.remove(word)
+            row, column, is_across = slot[:3]
+            placements.append(
+                {
+                    "word": word,
+                    "row": row,
+                    "column": column,
+                    "isAcross": is_across,
+                    "clue": fake_lexicon[word],
+                    "positions": _positions(word, row, column, is_across),
+                }
+            )
+
+        count -= len(placements)
+        for word in self._rng.sample(choices, min(count, len(choices))):
+            is_across = self._rng.random() < 0.5
+            row = self._rng.randrange(
+                grid_size if is_across else grid_size - len(word) + 1
+            )
+            column = self._rng.randrange(
+                grid_size - len(word) + 1 if is_across else grid_size
+            )
+            placements.append(
+                {
+                    "word": word,
+                    "row": row,
+                    "column": column,
+                    "isAcross": is_across,
+                    "clue": fake_lexicon[word],
+                    "positions": _positions(word, row, column, is_across),
+                }
+            )
+        return placements
+
+    def _generate_word(self, human):
+        placements = self._placements(human, 1)
+        if not placements:
+            return json.dumps({"message": "No word can be added"})
+        return "Picking a random slot and word.\n" + json.dumps(
+            placements[0], indent=4
+        )
+
+    def _generate_candidates(self, human):
+        count = int(_field(human, "candidate_count", 3))
+        placements = self._placements(human, count)
+        if not placements:
+            return json.dumps({"message": "No word can be added"})
+        return "Picking random slots and words.\n" + json.dumps(
+            {"candidates": placements}, indent=4
+        )
+
+    def _guess(self, clue):
+        answer = CLUE_BOOK.get(clue["clue"])
+        if answer and len(answer) == clue["length"] and self._rng.random() < self.accuracy:
+            return answer
+        # a wrong guess comes from the wordlist candidates when given any
+        same_length = clue.get("candidates") or [
+            w for w in sorted(fake_lexicon) if len(w) == clue["length"]
+        ]
+        if same_length:
+            return self._rng.choice(same_length)
+        return "x" * clue["length"]
+
+    def _solve_clue(self, human):
+        clue_metadata = _field(human, "clue_metadata", [])
+        if not clue_metadata:
+            return json.dumps({"message": "No word can be guessed"})
+
+        clue = self._rng.choice(clue_metadata)
+        word = self._guess(clue)
+        return f"Guessing clue '{clue['clue']}'.\n" + json.dumps(
+            {
+                "word": word,
+                "row": clue["row"],
+                "column": clue["column"],
+                "isAcross": clue["across"],
+                "clue": clue["clue"],
+                "positions": _positions(word, clue["row"], clue["column"], clue["across"]),
+            },
+            indent=4,
+        )
+
+    def _solve_clues(self, human):
+        guesses = []
+        for clue in _field(human, "clue_metadata", []):
+            guesses.append(
+                {
+                    "word": self._guess(clue),
+                    "row": clue["row"],
+                    "column": clue["column"],
+                    "isAcross": clue["across"],
+                    "clue": clue["clue"],
+                }
+            )
+        return "Guessing every clue.\n" + json.dumps({"guesses": guesses}, indent=2)
+
+    def _update_clues(self, human):
+        request = _field(human, "words", {"words": []})
+        difficulty = str(_field(human, "difficulty", "MEDIUM")).lower()
+        updated = []
+        for word_d in request.get("words", []):
+            base = fake_lexicon.get(word_d["word"], f"A word of {len(word_d['word'])} letters.")
+            clue = f"{base} ({difficulty}, take {self._rng.randrange(1000)})"
+            CLUE_BOOK[clue] = word_d["word"]
+            updated.append({"word": word_d["word"], "updatedClue": clue})
+        return json.dumps({"words": updated}, indent=2)
+
+    def _failure(self):
+        if self._rng.random() < self.rate_limit_rate:
+            return FakeRateLimitError(self.model)
+        if self._rng.random() < self.failure_rate:
+            return FakeLLMError(self.model)
+        return None
+
+    def _message(self, text, tools):
+        """
+        The reply as text, or with tools as a call of the first tool whose
+        arguments are the reply's JSON, without the reasoning before it.
+        """
+        if not tools or "{" not in text:
+            return AIMessage(content=text)
+        try:
+            args, _ = json.JSONDecoder().raw_decode(text, text.index("{"))
+        except json.JSONDecodeError:
+            return AIMessage(content=text)
+        name = tools[0]["function"]["name"]
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}],
+        )
+
+    def _result(self, phase, text, started_at, tools=None):
+        failure = self._failure()
+        if failure:
+            _record_call(phase, started_at, True)
+            raise failure
+        message = self._message(text, tools)
+        output_chars = len(message.content)
+        if message.tool_calls:
+            output_chars = len(json.dumps(message.tool_calls[0]["args"]))
+        _record_call(phase, started_at, False, output_chars)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started_at = time.perf_counter()
+        tools = kwargs.get("tools")
+        phase, text = self._respond(messages, bool(tools))
+        time.sleep(self._delay())
+        return self._result(phase, text, started_at, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        started_at = time.perf_counter()
+        tools = kwargs.get("tools")
+        phase, text = self._respond(messages, bool(tools))
+        await asyncio.sleep(self._delay())
+        return self._result(phase, text, started_at, tools)
+
+    def _stream_plan(self, messages):
+        """
+        Splits the reply into chunks and spreads the call latency over them,
+        so a caller that stops reading early also saves time.
+        """
+        phase, text = self._respond(messages)
+        size = max(1, self.stream_chunk_size)
+        chunks = [text[i : i + size] for i in range(0, len(text), size)] or [""]
+        return phase, chunks, self._delay() / len(chunks), self._failure()
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        started_at = time.perf_counter()
+        phase, chunks, delay, failure = self._stream_plan(messages)
+        sent = 0
+        try:
+            if failure:
+                raise failure
+            for i, chunk in enumerate(chunks, 1):
+                # sleep until this chunk is due so per-chunk overhead does not add up
+                time.sleep(max(0.0, started_at + i * delay - time.perf_counter()))
+                sent += len(chunk)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        finally:
+            _record_call(phase, started_at, bool(failure), sent)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        started_at = time.perf_counter()
+        phase, chunks, delay, failure = self._stream_plan(messages)
+        sent = 0
+        try:
+            if failure:
+                raise failure
+            for i, chunk in enumerate(chunks, 1):
+                await asyncio.sleep(max(0.0, started_at + i * delay - time.perf_counter()))
+                sent += len(chunk)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        finally:
+            _record_call(phase, started_at, bool(failure), sent)
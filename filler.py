@@ -0,0 +1,139 @@
+import random
+from grid import Grid, MIN_WORD_LENGTH
+
+# placements tried per step before backtracking further up
+DEFAULT_BRANCHING = 8
+DEFAULT_MAX_STEPS = 5000
+
+
+def format_positions(word_d):
+    row, column = int(word_d["row"]), int(word_d["column"])
+    return ", ".join(
+        f"({char}, {row + (0 if word_d['isAcross'] else i)}, "
+        f"{column + (i if word_d['isAcross'] else 0)})"
+        for i, char in enumerate(word_d["word"])
+    )
+
+
+def placement(word, row, column, is_across):
+    word_d = {"word": word, "row": row, "column": column, "isAcross": is_across}
+    word_d["clue"] = ""
+    word_d["positions"] = format_positions(word_d)
+    return word_d
+
+
+class GridFiller:
+    """
+    Fills a grid with words from a WordIndex by depth-first search over the
+    grid's open slots, always extending the slot with the fewest fitting
+    words and undoing placements that lead to a dead end. Theme words are
+    tried before wordlist words wherever they fit.
+    """
+
+    def __init__(
+        self,
+        word_index,
+        theme_words=None,
+        seed=None,
+        branching=DEFAULT_BRANCHING,
+        max_steps=DEFAULT_MAX_STEPS,
+    ):
+        self.word_index = word_index
+        self.theme_words = [word.lower() for word in theme_words or []]
+        self.rng = random.Random(seed)
+        self.branching = branching
+        self.max_steps = max_steps
+
+    def fill(self, grid_size, word_count):
+        """
+        Returns a Grid holding word_count words, or the largest fill found
+        within max_steps placements.
+        """
+        self.grid = Grid(grid_size)
+        self.word_count = word_count
+        self.steps = 0
+        self.best = []
+        self._search()
+
+        if len(self.grid.entries) < len(self.best):
+            self.grid = Grid(grid_size)
+            for word_d in self.best:
+                self.grid.place(word_d)
+        return self.grid
+
+    def _search(self):
+        if len(self.grid.entries) > len(self.best):
+            self.best = list(self.grid.entries)
+        if len(self.grid.entries) >= self.word_count:
+            return True
+
+        for word_d in self._next_placements():
+            if self.steps >= self.max_steps:
+                return False
+            self.steps += 1
+            self.grid.place(word_d)
+            if self._search():
+                return True
+            self.grid.undo()
+        return False
+
+    def _unused(self, words):
+        used = set(self.grid.words)
+        return [word for word in words if word not in used]
+
+    def _ordered(self, theme_matches, matches):
+        """
+        Fitting theme words first, then a random sample of the other words.
+        """
+        theme_matches = self._unused(theme_matches)
+        matches = self._unused(
+            [word for word in matches if word not in self.theme_words]
+        )
+        self.rng.shuffle(matches)
+        return (theme_matches + matches)[: self.branching]
+
+    def _next_placements(self):
+        size = self.grid.grid_size
+        if not self.grid.entries:
+            # start with an across word through the middle of the grid
+            lengths = range(MIN_WORD_LENGTH, size + 1)
+            words = self._ordered(
+                [word for word in self.theme_words if len(word) in lengths],
+                [
+                    word
+                    for length in lengths
+                    for word in self.word_index.candidates(length)
+                    if length >= min(5, size)
+                ],
+            )
+            return [
+                placement(word, size // 2, (size - len(word)) // 2, True)
+                for word in words
+            ]
+
+        slots = []
+        for slot in self.grid.slot_index().slots():
+            count = sum(
+                self.word_index.count(length, slot.pattern[:length])
+                for length in slot.lengths
+            )
+            count += sum(1 for word in self.theme_words if slot.fits(word))
+            if count:
+                slots.append((count, self.rng.random(), slot))
+        for _, _, slot in sorted(slots, key=lambda entry: entry[:2]):
+            words = self._ordered(
+                [word for word in self.theme_words if slot.fits(word)],
+                [
+                    word
+                    for length in slot.lengths
+                    for word in self.word_index.candidates(
+                        length, slot.pattern[:length]
+                    )
+                ],
+            )
+            if words:
+                return [
+                    placement(word, slot.row, slot.column, slot.is_across)
+                    for word in words
+                ]
+        return []
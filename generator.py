@@ -1,138 +1,646 @@
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from langchain.schema import SystemMessage
 from dotenv import load_dotenv
 import json
 import argparse
+import random
+import time
 from collections import Counter
 from configs.solver import solver_configs
-import multiprocessing
-from multiprocessing import Pool
+from configs.fake import fake_solver_configs
+import asyncio
+from functools import lru_cache
 from helper import *
-from functools import partial
-from solver import solve
+from encoders import GRID_ENCODERS, apply_grid_format, encode_grid
+from tracing import (
+    Tracer,
+    call_usage,
+    get_tracer,
+    llm_name,
+    record_response,
+    set_tracer,
+    trace_llm_call,
+    trace_validation,
+)
+from solver import asolve
+from streaming import astream_response, placement_error, stream_response
+from hedging import latency_tracker, first_accepted, run_async
+from wordlist import WORDLIST_SOLVER_MODEL, load_word_index
+from filler import GridFiller
+from region import generation_region, grid_summary, region_view
+from solver_service import get_solver_service
+from checkpoint import Checkpoint, unfinished_log
+from structured import Candidates, GeneratedWord, UpdatedClues, read_response
+from ensemble import DEFAULT_POLICY, DEFAULT_STATS_PATH, SolverStats
+from cache import SQLiteCache, remember_response, set_llm_cache
+from configs.rate_limits import rate_limits
+from ratelimit import set_rate_limits
+from transcript import (
+    TranscriptWriter,
+    current_transcript,
+    set_transcript_recording,
+    transcript_event,
+)
 
 load_dotenv()
 
-GENERATE_WORD_PROMPT_TEMPLATE = read_prompt_template(
-    "prompts/generate_word_prompt_template.txt"
-)
-GENERATE_APPROPRIATE_CLUE_PROMPT_TEMPLATE = read_prompt_template(
-    "prompts/clue_generation_prompt_template.txt"
-)
-WORD_GENERATION_CHAT_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        SystemMessage(content=GENERATE_WORD_PROMPT_TEMPLATE),
-        HumanMessagePromptTemplate.from_template(
-            "char_positions=\n{char_positions}\n\nwords={words}\n\ngrid_size={grid_size}\n\ndifficulty={difficulty}"
-        ),
-    ]
-)
-CLUE_GENERATION_CHAT_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        SystemMessage(content=GENERATE_APPROPRIATE_CLUE_PROMPT_TEMPLATE),
-        HumanMessagePromptTemplate.from_template(
-            "words:\n{words}\n\ndifficulty:{difficulty}"
+# prompt files, read the first time a prompt using them is built
+GENERATE_WORD_PROMPT_FILE = "prompts/generate_word_prompt_template.txt"
+GENERATE_CANDIDATES_PROMPT_FILE = "prompts/generate_candidates_prompt_template.txt"
+GENERATE_APPROPRIATE_CLUE_PROMPT_FILE = "prompts/clue_generation_prompt_template.txt"
+OPEN_SLOTS_PROMPT_FILE = "prompts/open_slots_prompt_template.txt"
+REGION_PROMPT_FILE = "prompts/region_prompt_template.txt"
+STRUCTURED_OUTPUT_PROMPT_FILE = "prompts/structured_output_prompt_template.txt"
+
+
+@lru_cache(maxsize=None)
+def build_generation_prompt(
+    with_candidates,
+    with_slots,
+    grid_format="dicts",
+    with_region=False,
+    structured=False,
+):
+    system_template = apply_grid_format(
+        read_prompt_template(
+            GENERATE_CANDIDATES_PROMPT_FILE
+            if with_candidates
+            else GENERATE_WORD_PROMPT_FILE
         ),
-    ]
-)
+        grid_format,
+    )
+    human_template = "char_positions=\n{char_positions}\n\nwords={words}\n\ngrid_size={grid_size}\n\ndifficulty={difficulty}"
+    if with_candidates:
+        human_template += "\n\ncandidate_count={candidate_count}"
+    if with_slots:
+        system_template += "\n\n" + read_prompt_template(OPEN_SLOTS_PROMPT_FILE)
+        human_template += "\n\nopen_slots=\n{open_slots}"
+    if with_region:
+        system_template += "\n\n" + read_prompt_template(REGION_PROMPT_FILE)
+        human_template += "\n\nregion={region}\n\ngrid_summary={grid_summary}"
+    if structured:
+        system_template += "\n\n" + read_prompt_template(
+            STRUCTURED_OUTPUT_PROMPT_FILE
+        )
+
+    return chat_prompt(system_template, human_template)
+
+
+@lru_cache(maxsize=None)
+def build_clue_prompt(structured=False):
+    system_template = read_prompt_template(GENERATE_APPROPRIATE_CLUE_PROMPT_FILE)
+    if structured:
+        system_template += "\n\n" + read_prompt_template(
+            STRUCTURED_OUTPUT_PROMPT_FILE
+        )
+    return chat_prompt(system_template, "words:\n{words}\n\ndifficulty:{difficulty}")
+
+
+# --gen_model choice -> PuzzleLLM model name
+GEN_MODELS = {
+    "claude": "claude-3-5-sonnet-latest",
+    "gpt": "gpt-4o",
+    "llama": "llama-3.3-70b-versatile",
+    "mistral": "mistral",
+    "fake": "fake-generator",
+}
+
 
+# default generation call budget per word when backtracking
+CALLS_PER_WORD = 10
 
-def append_new_word(words_dict, new_word):
-    words_dict.get("words").append(new_word)
 
+def get_generator_config(gen_model):
+    return {
+        "model": GEN_MODELS[gen_model],
+        "temperature": 1,
+        "max_tokens": 4096,
+        "timeout": None,
+        "max_retries": 4,
+    }
+
+
+def get_attempt_llms(gen_model, count, gen_models=None, temperatures=None):
+    """
+    Clients for count concurrent generation attempts, cycling through
+    gen_models (--gen_model choices) and temperatures when given.
+    """
+    gen_models = gen_models or [gen_model]
+    llms = []
+    for i in range(count):
+        config = get_generator_config(gen_models[i % len(gen_models)])
+        if temperatures:
+            config["temperature"] = temperatures[i % len(temperatures)]
+        llms.append(get_llm(config))
+    return llms
+
+
+def placement_key(word_d):
+    return (
+        word_d["word"].lower(),
+        int(word_d["row"]),
+        int(word_d["column"]),
+        word_d["isAcross"],
+    )
+
+
+def first_fitting_candidate(llm, grid, candidates, verbose=False, avoid=()):
+    for candidate in candidates:
+        if placement_key(candidate) in avoid:
+            reason = "backtracked"
+        else:
+            reason = placement_error(grid, candidate)
+        if reason is None:
+            return candidate
+        vprint(verbose, f"REJECTED {candidate['word']}: {reason}")
+        trace_validation(llm, "generate", candidate, "rejected", reason)
+    return None
+
+
+def place_first_candidate(llm, grid, candidates, verbose=False, avoid=()):
+    candidate = first_fitting_candidate(llm, grid, candidates, verbose, avoid)
+    if candidate:
+        grid.place(candidate)
+        trace_validation(llm, "generate", candidate, "accepted")
+    return candidate
+
+
+def read_candidates(
+    event, response, aborted, candidate_count, verbose=False, structured=False
+):
+    vprint(verbose, "Attempting to generate a new word")
+    vprint(verbose, response.content)
+    vprint(verbose, "*" * 50)
+
+    # extract new word from response
+    vprint(verbose, "Extracting new word from response")
+    if aborted:
+        vprint(verbose, f"ABORTED response early: {aborted}")
+        event["parse_outcome"] = "aborted"
+        candidates = []
+    elif candidate_count > 1:
+        candidates = read_response(
+            event,
+            response.content,
+            Candidates if structured else None,
+            lambda text: {"candidates": extract_candidates_from_text(text)},
+        )["candidates"]
+        event["parse_outcome"] = "ok" if candidates else "no_candidates"
+    else:
+        new_word_dict = read_response(
+            event,
+            response.content,
+            GeneratedWord if structured else None,
+            extract_json_from_text,
+        )
+        event["parse_outcome"] = parse_outcome(new_word_dict)
+        candidates = [new_word_dict] if event["parse_outcome"] == "ok" else []
+    vprint(verbose, candidates)
+    vprint(verbose, "*" * 50)
+    return candidates
+
+
+def generation_schema(candidate_count):
+    return Candidates if candidate_count > 1 else GeneratedWord
+
+
+def retry_reason(event, candidates, aborted):
+    return aborted or ("invalid_placement" if candidates else event["parse_outcome"])
+
+
+async def agenerate_attempt(
+    llm,
+    grid,
+    messages,
+    candidate_count,
+    verbose,
+    stream,
+    hedge=False,
+    avoid=(),
+    structured=False,
+):
+    """
+    One of several concurrent generation requests. Returns the first of its
+    candidates that fits the grid without placing it, or None.
+    """
+    started_at = time.perf_counter()
+    with trace_llm_call(llm, "generate", messages) as event:
+        if hedge:
+            event["hedge"] = True
+        aborted = None
+        if structured:
+            response = await llm.ainvoke(
+                input=messages, schema=generation_schema(candidate_count)
+            )
+        elif not stream:
+            response = await llm.ainvoke(input=messages)
+        elif candidate_count > 1:
+            response, aborted = await astream_response(
+                llm, messages, ["candidates", "message"]
+            )
+        else:
+            response, aborted = await astream_response(
+                llm,
+                messages,
+                ["word", "message"],
+                check=lambda word_d: placement_error(grid, word_d),
+            )
+        latency_tracker.record(llm_name(llm), time.perf_counter() - started_at)
+        record_response(event, response)
+
+        candidates = read_candidates(
+            event, response, aborted, candidate_count, verbose, structured
+        )
+        candidate = first_fitting_candidate(llm, grid, candidates, verbose, avoid)
+        if candidate:
+            schema = generation_schema(candidate_count) if structured else None
+            remember_response(llm, messages, response, schema)
+        else:
+            event["retry_reason"] = retry_reason(event, candidates, aborted)
+        return llm, candidate
+
+
+async def agenerate_hedged(
+    grid,
+    messages,
+    attempt_llms,
+    candidate_count,
+    verbose,
+    stream,
+    hedge_percentile=None,
+    avoid=(),
+    structured=False,
+):
+    """
+    Sends the generation request to every client in attempt_llms at once
+    and places the first fitting word, cancelling the other requests. With
+    hedge_percentile, the first client's request is sent again once it has
+    taken longer than that percentile of its recent latencies.
+    """
+
+    def attempt(llm, hedge=False):
+        return lambda: agenerate_attempt(
+            llm,
+            grid,
+            messages,
+            candidate_count,
+            verbose,
+            stream,
+            hedge,
+            avoid,
+            structured,
+        )
+
+    def accept(result):
+        llm, candidate = result
+        if candidate:
+            grid.place(candidate)
+            trace_validation(llm, "generate", candidate, "accepted")
+        return candidate
+
+    hedge_after = None
+    if hedge_percentile is not None:
+        hedge_after = latency_tracker.threshold(
+            llm_name(attempt_llms[0]), hedge_percentile / 100
+        )
+    return await first_accepted(
+        [attempt(llm) for llm in attempt_llms],
+        accept,
+        hedge=attempt(attempt_llms[0], hedge=True),
+        hedge_after=hedge_after,
+    )
+
+
+def place_generated_word(
+    llm, grid, messages, candidate_count, verbose, stream, avoid=(), structured=False
+):
+    started_at = time.perf_counter()
+    with trace_llm_call(llm, "generate", messages) as event:
+        aborted = None
+        if structured:
+            response1 = llm.invoke(
+                input=messages, schema=generation_schema(candidate_count)
+            )
+        elif not stream:
+            response1 = llm.invoke(input=messages)
+        elif candidate_count > 1:
+            response1, aborted = stream_response(
+                llm, messages, ["candidates", "message"]
+            )
+        else:
+            response1, aborted = stream_response(
+                llm,
+                messages,
+                ["word", "message"],
+                check=lambda word_d: placement_error(grid, word_d),
+            )
+        latency_tracker.record(llm_name(llm), time.perf_counter() - started_at)
+        record_response(event, response1)
+
+        candidates = read_candidates(
+            event, response1, aborted, candidate_count, verbose, structured
+        )
+
+        # accept the first candidate that fits the grid
+        placed = place_first_candidate(llm, grid, candidates, verbose, avoid)
+        if placed:
+            schema = generation_schema(candidate_count) if structured else None
+            remember_response(llm, messages, response1, schema)
+        else:
+            event["retry_reason"] = retry_reason(event, candidates, aborted)
+    return placed
+
+
+def generate_next_word(
+    llm,
+    grid,
+    desired_difficulty,
+    retry_count=1,
+    candidate_count=1,
+    max_slots=None,
+    grid_format="dicts",
+    verbose=False,
+    stream=False,
+    attempt_llms=None,
+    hedge_percentile=None,
+    avoid=(),
+    region_size=None,
+    structured=False,
+    rng=random,
+):
+    """
+    Adds one word to the grid. Passing max_slots includes up to that many
+    entries of the grid's open-slot index in the prompt (0 for all of them).
+    With stream, the response is read only up to its answer JSON and is
+    abandoned as soon as the proposed word visibly does not fit the grid.
 
-def remove_last_word(words_dict):
-    words_dict.get("words").pop()
+    With attempt_llms or hedge_percentile, each try is sent concurrently to
+    every client in attempt_llms (just llm by default), see agenerate_hedged.
+    Placements whose placement_key is in avoid are rejected.
 
+    With region_size, a grid larger than that is sent as the region_size
+    square around one of its open slots, picked with rng, plus a one-line
+    summary, so the prompt stays the same size as the grid fills up.
 
-def generate_next_word(llm, grid_size, input_words, desired_difficulty, retry_count=1):
-    # get character positions
-    char_positions, words = get_character_positions_and_words(input_words, grid_size)
-    # print_char_positions_and_words(char_positions, words)
+    With structured, the PuzzleLLM answers with a tool call validated
+    against the structured.py schemas instead of text, and stream is ignored.
 
+    Returns (generated, new word dict, tries used).
+    """
     generated = False
     new_word_dict = {}
+    tries = 0
+    with_slots = max_slots is not None
 
     while not generated and retry_count > 0:
-        # get new word
-        response1 = llm.invoke(
-            input=WORD_GENERATION_CHAT_PROMPT.format_messages(
-                char_positions=char_positions,
-                words=words,
-                grid_size=grid_size,
-                difficulty=desired_difficulty.upper(),
-            )
+        tries += 1
+        view, region = grid, None
+        if region_size and grid.grid_size > region_size:
+            region = generation_region(grid, region_size, rng)
+            if region is not None:
+                view = region_view(grid, region)
+        prompt = build_generation_prompt(
+            candidate_count > 1,
+            with_slots,
+            grid_format,
+            region is not None,
+            structured,
         )
-        print("Attempting to generate a new word")
-        print(response1.content)
-        print("*" * 50)
-
-        # extract new word from response1
-        print("Extracting new word from response")
-        new_word_dict = extract_json_from_text(response1.content)
-        print(new_word_dict)
-        print("*" * 50)
 
-        if isinstance(new_word_dict, dict) and not new_word_dict.get("message"):
-            append_new_word(input_words, new_word_dict)
-            try:
-                char_positions, words = get_character_positions_and_words(
-                    input_words, grid_size
+        # get new word, or a ranked list of candidates for it; the full word
+        # list is always sent so the new word is not a duplicate
+        messages = prompt.format_messages(
+            char_positions=encode_grid(view, grid_format),
+            words=grid.words,
+            grid_size=grid.grid_size,
+            difficulty=desired_difficulty.upper(),
+            candidate_count=candidate_count,
+            open_slots=(
+                grid.slot_index().describe(max_slots or None, region)
+                if with_slots
+                else None
+            ),
+            region=region.describe() if region else None,
+            grid_summary=grid_summary(grid, view) if region else None,
+        )
+        if attempt_llms or hedge_percentile is not None:
+            placed = run_async(
+                agenerate_hedged(
+                    grid,
+                    messages,
+                    attempt_llms or [llm],
+                    candidate_count,
+                    verbose,
+                    stream,
+                    hedge_percentile,
+                    avoid,
+                    structured,
                 )
-                generated = True
-            except (CharacterConflictException, OutOfBoundsException) as e:
-                print(e)
-                print("Retrying...")
-                print("*" * 50)
-                remove_last_word(input_words)
-                retry_count -= 1
+            )
+        else:
+            placed = place_generated_word(
+                llm,
+                grid,
+                messages,
+                candidate_count,
+                verbose,
+                stream,
+                avoid,
+                structured,
+            )
+
+        if placed:
+            new_word_dict = placed
+            generated = True
         else:
-            print("Retrying...")
+            vprint(verbose, "Retrying...")
+            vprint(verbose, "*" * 50)
             retry_count -= 1
-    return generated, input_words, new_word_dict
+    return generated, new_word_dict, tries
 
 
-def generate(llm, grid_size, word_count, desired_difficulty):
+def backtrack(grid, depth, avoid, checkpoint=None, calls=0):
+    """
+    Removes the depth most recently placed words and adds their placements
+    to avoid, so they are not accepted again. Returns the removed words.
+    """
+    removed = []
+    for _ in range(min(depth, len(grid.entries))):
+        word_d = grid.entries[-1]
+        grid.undo()
+        avoid.add(placement_key(word_d))
+        removed.append(word_d["word"])
+        if checkpoint is not None:
+            checkpoint.undo(placement_key(word_d), calls, depth)
+    return removed
+
+
+def generate(
+    llm,
+    grid_size,
+    word_count,
+    desired_difficulty,
+    candidate_count=1,
+    max_slots=None,
+    grid_format="dicts",
+    verbose=False,
+    stream=False,
+    output_dir="output",
+    attempt_llms=None,
+    hedge_percentile=None,
+    checkpoint=None,
+    backtrack_depth=0,
+    max_generation_calls=None,
+    region_size=None,
+    structured=False,
+    seed=None,
+):
+    """
+    Places word_count words one PuzzleLLM call at a time.
+
+    With backtrack_depth, a dead end - no legal slot left in the grid, or a
+    word that could not be placed within its retries - removes the most
+    recent word instead of asking again, and each further dead end before
+    the grid gets past its fullest state so far removes one more word, up
+    to backtrack_depth at once. max_generation_calls caps the generation
+    requests of the whole run (CALLS_PER_WORD per word when backtracking).
+    seed seeds the choice of regions.
+    """
+    rng = random.Random(seed)
     count = 0
     generated = True
     api_retry_count = 3
-    crossword_json = {"words": []}
+    grid = Grid(grid_size)
+    calls = 0
+    depth = 0
+    avoid = set()
+    best = []
+    if checkpoint is not None:
+        # the backtracked placements and the spent calls are restored too,
+        # so a resumed search does not walk back into its dead ends
+        placed, best, avoid, calls, depth = checkpoint.placed_words()
+        for word_d in placed:
+            grid.place(word_d)
+        count = len(grid.entries)
+        if count or calls:
+            print(
+                f"RESUMED {count} word(s) after {calls} generation call(s) "
+                f"from {checkpoint.path}"
+            )
+
+    if backtrack_depth and max_generation_calls is None:
+        max_generation_calls = CALLS_PER_WORD * word_count
+    # requests sent per try
+    width = len(attempt_llms) if attempt_llms else 1
     while count < word_count and api_retry_count > 0:
-        generated, input_words, added_word = generate_next_word(
-            llm, grid_size, crossword_json, desired_difficulty, 5
-        )
+        if max_generation_calls is not None and calls + width > max_generation_calls:
+            print(f"STOPPED: used {calls} of {max_generation_calls} generation calls")
+            break
+
+        if backtrack_depth and grid.entries and not grid.slot_index().slots():
+            print("DEAD END: no legal slot left in the grid")
+            generated = False
+        else:
+            retries = 5
+            if max_generation_calls is not None:
+                retries = min(retries, (max_generation_calls - calls) // width)
+            generated, added_word, tries = generate_next_word(
+                llm,
+                grid,
+                desired_difficulty,
+                retries,
+                candidate_count,
+                max_slots,
+                grid_format,
+                verbose,
+                stream,
+                attempt_llms,
+                hedge_percentile,
+                avoid,
+                region_size,
+                structured,
+                rng,
+            )
+            calls += tries * width
 
         if generated:
             count += 1
             api_retry_count = 3
+            if checkpoint is not None:
+                checkpoint.word(added_word, calls)
+            if count > len(best):
+                best = list(grid.entries)
+                depth = 0
             print(f"SUCCESS: new word added is {added_word}")
             print(f"New word count: {count}")
             print("*" * 50)
+        elif backtrack_depth and grid.entries:
+            depth = min(depth + 1, backtrack_depth)
+            removed = backtrack(grid, depth, avoid, checkpoint, calls)
+            count = len(grid.entries)
+            print(f"BACKTRACKED: removed {removed}, word count: {count}")
+            print("*" * 50)
+            get_tracer().emit(
+                "backtrack", phase="generate", removed=removed, word_count=count
+            )
         else:
             print("FAILED: calling API to add word again")
             print("*" * 50)
             api_retry_count -= 1
 
-        crossword_json = input_words
+    if len(grid.entries) < len(best):
+        # the search ended below the fullest grid it reached
+        grid = Grid(grid_size)
+        for word_d in best:
+            grid.place(word_d)
+        count = len(best)
 
-    write_file(crossword_json, 0)
+    crossword_json = grid.to_json()
+    output_file = write_file(crossword_json, 0, verbose, output_dir)
     print(f"Final Added Word Count: {count}")
 
-    grid_data, _ = get_character_positions_and_words(crossword_json, grid_size)
-    positions = {}
-    for d in grid_data:
-        positions[f"{d['row']},{d['column']}"] = d["character"]
+    print(f"\nCROSSWORD:")
+    print(grid.render())
+
+    return crossword_json, output_file
+
+
+def generate_filled(
+    llm,
+    grid_size,
+    word_count,
+    desired_difficulty,
+    word_index,
+    theme_words=None,
+    verbose=False,
+    output_dir="output",
+    structured=False,
+    seed=None,
+):
+    """
+    Fills the grid locally from the wordlist and then writes the clues for
+    every word in a single call to the PuzzleLLM.
+    """
+    grid = GridFiller(word_index, theme_words, seed).fill(grid_size, word_count)
+    crossword_json = grid.to_json()
+    print(f"Filled {len(grid.entries)} word(s) from the wordlist: {grid.words}")
+    print("*" * 50)
+
+    update_crossword(
+        llm,
+        crossword_json,
+        grid.words,
+        desired_difficulty,
+        phase="clue-write",
+        structured=structured,
+        verbose=verbose,
+    )
+
+    output_file = write_file(crossword_json, 0, verbose, output_dir)
+    print(f"Final Added Word Count: {len(grid.entries)}")
 
     print(f"\nCROSSWORD:")
-    for i in range(grid_size):
-        for j in range(grid_size):
-            if f"{i},{j}" in positions:
-                print(positions[f"{i},{j}"], end=" ")
-            else:
-                print("_", end=" ")
-        print()
+    print(grid.render())
 
-    return crossword_json, "output/crossword-0.json"
+    return crossword_json, output_file
 
 
 def get_word_perc(crossword, solver_responses):
@@ -160,51 +668,109 @@ def get_word_perc(crossword, solver_responses):
     return perc
 
 
-def determine_clue_updates_needed(crossword, solve_perc, desired_difficulty):
-    update_clue = {}
+# accuracy band each difficulty wants most of the words to fall into
+TARGET_BANDS = {
+    Difficulty.EASY.value: "high",
+    Difficulty.MEDIUM.value: "medium",
+    Difficulty.HARD.value: "low",
+}
 
-    words = [word_d["word"] for word_d in crossword["words"]]
 
-    low_acc_words = []
-    medium_acc_words = []
-    high_acc_words = []
+def accuracy_band(perc):
+    if perc < 0.5:
+        return "low"
+    if perc > 0.75:
+        return "high"
+    return "medium"
 
-    for word in words:
-        if solve_perc[word] < 0.5:
-            low_acc_words.append(word)
-        elif solve_perc[word] > 0.75:
-            high_acc_words.append(word)
-        else:
-            medium_acc_words.append(word)
 
-    if desired_difficulty == Difficulty.EASY.value and len(
-        high_acc_words
-    ) >= 0.75 * len(words):
-        return update_clue
+def difficulty_met(desired_difficulty, band_count, word_count):
+    """
+    Whether the puzzle matches the difficulty when band_count of its words
+    fall in the difficulty's target band.
+    """
+    if desired_difficulty == Difficulty.EASY.value:
+        return band_count >= 0.75 * word_count
+    if desired_difficulty == Difficulty.HARD.value:
+        return band_count > 0.5 * word_count
+    return 0.5 * word_count <= band_count < 0.75 * word_count
 
-    if desired_difficulty == Difficulty.HARD.value and len(low_acc_words) > 0.5 * len(
-        words
+
+def needs_clue_update(perc, desired_difficulty):
+    if desired_difficulty == Difficulty.EASY.value:
+        return perc < 0.75
+    if desired_difficulty == Difficulty.HARD.value:
+        return perc > 0.5
+    return not 0.5 <= perc <= 0.75
+
+
+def determine_clue_updates_needed(crossword, solve_perc, desired_difficulty):
+    words = [word_d["word"] for word_d in crossword["words"]]
+    bands = Counter(accuracy_band(solve_perc[word]) for word in words)
+    if difficulty_met(
+        desired_difficulty, bands[TARGET_BANDS[desired_difficulty]], len(words)
     ):
-        return update_clue
+        return {}
 
-    if desired_difficulty == Difficulty.MEDIUM.value and 0.5 * len(words) <= len(
-        medium_acc_words
-    ) < 0.75 * len(words):
-        return update_clue
+    return {word: needs_clue_update(solve_perc[word], desired_difficulty) for word in words}
+
+
+def possible_word_percs(crossword, solver_responses, pending):
+    """
+    Every solved percentage each word can still end up with once up to
+    `pending` more solvers report, given the responses received so far.
+    """
+    solved = Counter(word for response in solver_responses for word in response["solved"])
+    received = len(solver_responses)
+    return {
+        word_d["word"]: {
+            (solved[word_d["word"]] + extra) / total
+            for total in range(max(received, 1), received + pending + 1)
+            for extra in range(total - received + 1)
+        }
+        for word_d in crossword["words"]
+    }
+
+
+def clue_updates_decided(crossword, solver_responses, pending, desired_difficulty):
+    """
+    True when no outcome of the pending solvers can change the result of
+    determine_clue_updates_needed, so they need not be waited for.
+    """
+    if not solver_responses:
+        return False
+    percs = possible_word_percs(crossword, solver_responses, pending)
+    target = TARGET_BANDS[desired_difficulty]
+    in_target = [{accuracy_band(p) == target for p in ps} for ps in percs.values()]
+    lowest = sum(1 for bands in in_target if bands == {True})
+    highest = sum(1 for bands in in_target if True in bands)
+    met = {
+        difficulty_met(desired_difficulty, count, len(percs))
+        for count in range(lowest, highest + 1)
+    }
+    if met == {True}:
+        return True
+    if True in met:
+        return False
+    return all(
+        len({needs_clue_update(p, desired_difficulty) for p in ps}) == 1
+        for ps in percs.values()
+    )
 
-    for word_d in crossword["words"]:
-        word = word_d["word"]
-        if desired_difficulty == Difficulty.EASY.value:
-            update_clue[word] = True if solve_perc[word] < 0.75 else False
-        elif desired_difficulty == Difficulty.HARD.value:
-            update_clue[word] = True if solve_perc[word] > 0.5 else False
-        else:
-            update_clue[word] = False if 0.5 <= solve_perc[word] <= 0.75 else True
 
-    return update_clue
+def extract_clues_from_text(text):
+    return json.loads(text.strip("\n`").replace("json", ""))
 
 
-def update_crossword(llm, crossword, clue_update_words, desired_difficulty):
+def update_crossword(
+    llm,
+    crossword,
+    clue_update_words,
+    desired_difficulty,
+    phase="clue-update",
+    structured=False,
+    verbose=False,
+):
     request = {"words": []}
 
     for word_d in crossword["words"]:
@@ -212,19 +778,32 @@ def update_crossword(llm, crossword, clue_update_words, desired_difficulty):
         if word in clue_update_words:
             request["words"].append({"word": word, "clue": word_d["clue"]})
 
-    response = llm.invoke(
-        input=CLUE_GENERATION_CHAT_PROMPT.format_messages(
-            words=request, difficulty=desired_difficulty.upper()
-        )
+    messages = build_clue_prompt(structured).format_messages(
+        words=request, difficulty=desired_difficulty.upper()
     )
-
-    clue_json = response.content.strip("\n`").replace("json", "")
-
-    print("New clues generated are:")
-    print(clue_json)
-    print("*" * 50)
-
-    new_word_clues = json.loads(clue_json)
+    with trace_llm_call(llm, phase, messages) as event:
+        if structured:
+            response = llm.invoke(input=messages, schema=UpdatedClues)
+        else:
+            response = llm.invoke(input=messages)
+        record_response(event, response)
+
+        vprint(verbose, "New clues generated are:")
+        vprint(verbose, response.content)
+        vprint(verbose, "*" * 50)
+
+        try:
+            new_word_clues = read_response(
+                event,
+                response.content,
+                UpdatedClues if structured else None,
+                extract_clues_from_text,
+            )
+        except json.JSONDecodeError:
+            event["parse_outcome"] = "invalid_json"
+            raise
+        event["parse_outcome"] = "ok"
+        remember_response(llm, messages, response, UpdatedClues if structured else None)
 
     for word_d in crossword["words"]:
         word = word_d["word"]
@@ -233,13 +812,138 @@ def update_crossword(llm, crossword, clue_update_words, desired_difficulty):
                 word_d["clue"] = new_word_d["updatedClue"]
 
 
-def solve_wrapper(config, grid_size, output_file, verbose):
-    solver = get_llm(config)
-    response = solve(solver, config["model"], grid_size, output_file, verbose)
-    print(f"RESPONSE {config['model']}: {response}")
+async def asolve_wrapper(
+    config,
+    grid_size,
+    crossword,
+    verbose,
+    semaphore,
+    timeout,
+    memos,
+    checkpoint=None,
+    **solve_kwargs,
+):
+    if memos is not None:
+        solve_kwargs["memo"] = memos.setdefault(config["model"], {})
+    if checkpoint is not None:
+        solve_kwargs["on_guess"] = lambda key, word: checkpoint.solver_guess(
+            config["model"], key, word
+        )
+    async with semaphore:
+        if config["model"] == WORDLIST_SOLVER_MODEL:
+            solver = None
+            solve_kwargs["word_index"] = solve_kwargs.get("word_index") or load_word_index()
+        else:
+            # a warm client, shared with earlier iterations and puzzles
+            solver = get_solver_service().client(config)
+        # the calls and tokens of this solver, for the solver stats
+        usage = Counter()
+        call_usage.set(usage)
+        started_at = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                asolve(
+                    solver,
+                    config["model"],
+                    grid_size,
+                    crossword,
+                    verbose,
+                    **solve_kwargs,
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            print(f"TIMEOUT {config['model']}: no response after {timeout}s")
+            get_tracer().emit(
+                "solver_failed", model=config["model"], phase="solve", error="timeout"
+            )
+            return None
+        except Exception as e:
+            # one failing solver leaves the others to score the iteration
+            print(f"FAILED {config['model']}: {type(e).__name__}: {e}")
+            get_tracer().emit(
+                "solver_failed",
+                model=config["model"],
+                phase="solve",
+                error=f"{type(e).__name__}: {e}",
+            )
+            return None
+    response["model"] = config["model"]
+    response["latency_s"] = time.perf_counter() - started_at
+    response["usage"] = dict(usage)
+    vprint(verbose, f"RESPONSE {config['model']}: {response}")
+    if checkpoint is not None:
+        checkpoint.solver_done(config["model"], response)
     return response
 
 
+async def run_solvers(
+    crossword,
+    grid_size,
+    verbose,
+    max_concurrency=None,
+    timeout=None,
+    configs=None,
+    stop_when=None,
+    memos=None,
+    checkpoint=None,
+    **solve_kwargs,
+):
+    """
+    Runs the solvers concurrently and collects their responses as they
+    finish. stop_when(responses, pending) is asked after every response and
+    returning True cancels the solvers that are still running. memos holds
+    one clue memo per solver model that is kept across iterations, and
+    checkpoint records every guessed clue and finished solver.
+    """
+    configs = configs or solver_configs
+    semaphore = asyncio.Semaphore(max_concurrency or len(configs))
+    tasks = [
+        asyncio.ensure_future(
+            asolve_wrapper(
+                config,
+                grid_size,
+                crossword,
+                verbose,
+                semaphore,
+                timeout,
+                memos,
+                checkpoint,
+                **solve_kwargs,
+            )
+        )
+        for config in configs
+    ]
+
+    responses = []
+    pending = len(tasks)
+    try:
+        for next_response in asyncio.as_completed(tasks):
+            response = await next_response
+            pending -= 1
+            if response is not None:
+                responses.append(response)
+            if pending and stop_when and stop_when(responses, pending):
+                print(
+                    f"EARLY STOP: clue updates decided after {len(responses)} "
+                    f"response(s), cancelling {pending} solver(s)"
+                )
+                get_tracer().emit(
+                    "early_stop",
+                    phase="solve",
+                    responses=len(responses),
+                    cancelled=pending,
+                )
+                break
+    finally:
+        # also when the caller is cancelled or stop_when raises, so no solver
+        # keeps running on the service loop for an abandoned iteration
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return responses
+
+
 def print_puzzle_acc(crossword, solver_responses, model, difficulty):
     avg = 0
     """
@@ -261,12 +965,190 @@ def print_puzzle_acc(crossword, solver_responses, model, difficulty):
     print(
         f"\nGEN_MODEL: {model}, DIFFICULTY: {difficulty}, OVERALL PUZZLE ACCURACY: {avg}"
     )
+    return avg
+
+
+def score_responses(crossword, solver_responses, model, desired_difficulty, iteration):
+    """
+    Scores one iteration's solver responses and records the scores in the
+    transcript. Returns the solved percentage of every word and the clue
+    updates needed ({} when the difficulty is met).
+    """
+    accuracy = print_puzzle_acc(crossword, solver_responses, model, desired_difficulty)
+    solve_perc = get_word_perc(crossword, solver_responses)
+    update_clue = determine_clue_updates_needed(
+        crossword, solve_perc, desired_difficulty
+    )
+    transcript_event(
+        "scored",
+        iteration=iteration,
+        accuracy=accuracy,
+        perc=solve_perc,
+        clue_updates=[word for word in update_clue if update_clue[word]],
+        finished=not update_clue,
+        solvers=[response["model"] for response in solver_responses],
+    )
+    return solve_perc, update_clue
+
+
+def select_solvers(solvers, solver_stats, solver_policy, checkpoint):
+    """
+    The solvers the policy picks from their stats, or the ones picked
+    before a resumed run was interrupted.
+    """
+    picked_models = checkpoint.solver_selection()
+    if picked_models is not None:
+        print(f"RESUMED the solver selection: {picked_models}")
+        return [config for config in solvers if config["model"] in picked_models]
+
+    picked, left_out = solver_stats.select(solvers, **solver_policy)
+    picked_models = [config["model"] for config in picked]
+    print(f"SOLVERS: {picked_models}")
+    for model, reason in left_out.items():
+        print(f"LEFT OUT {model}: {reason}")
+    get_tracer().emit(
+        "solver_selection",
+        phase="solve",
+        solvers=picked_models,
+        left_out=left_out,
+        predicted_cost=sum(solver_stats.mean(model, "cost") for model in picked_models),
+    )
+    solver_stats.record_selection(picked_models, left_out)
+    checkpoint.solver_selection(picked_models)
+    return picked
 
 
 def generate_crossword(
-    llm, grid_size, word_count, desired_difficulty, iterations, verbose, model
+    llm,
+    grid_size,
+    word_count,
+    desired_difficulty,
+    iterations,
+    verbose,
+    model,
+    solver_concurrency=None,
+    solver_timeout=None,
+    solvers=None,
+    solver_batch_size=1,
+    candidate_count=1,
+    max_slots=None,
+    grid_format="dicts",
+    stream=False,
+    early_stop=False,
+    solver_memo=False,
+    word_index=None,
+    max_candidates=10,
+    wordlist_solver=False,
+    fill_mode="llm",
+    theme_words=None,
+    output_dir="output",
+    attempt_llms=None,
+    hedge_percentile=None,
+    resume=False,
+    overwrite=False,
+    backtrack_depth=0,
+    max_generation_calls=None,
+    region_size=None,
+    solver_stats=None,
+    solver_policy=None,
+    structured=False,
+    seed=None,
 ):
-    crossword, output_file = generate(llm, grid_size, word_count, desired_difficulty)
+    """
+    Generates the crossword and revises its clues for up to `iterations`
+    rounds of solving. Every completed step is appended to the checkpoint
+    log in output_dir; with resume the run continues from that log, and
+    the log of an unfinished run is only started over with overwrite.
+    solver_stats records the solver responses of every iteration and, with
+    a solver_policy, picks the solvers the run asks. With structured, every
+    LLM call asks for a tool call following the structured.py schemas.
+    The settings, the crossword every iteration hands to the solvers and
+    its scores are recorded in the current transcript, if any. seed seeds
+    the region choices and the wordlist filler, a random one by default.
+    """
+    if theme_words and fill_mode != "wordlist":
+        raise ValueError("theme_words are only placed with fill_mode wordlist")
+    if seed is None:
+        seed = random.randrange(2**32)
+    transcript_event(
+        "run",
+        gen_model=llm_name(llm),
+        model=model,
+        attempt_models=[llm_name(attempt) for attempt in attempt_llms or []],
+        solvers=list(solvers or solver_configs),
+        wordlist=word_index is not None,
+        settings={
+            "grid_size": grid_size,
+            "word_count": word_count,
+            "desired_difficulty": desired_difficulty,
+            "iterations": iterations,
+            "solver_concurrency": solver_concurrency,
+            "solver_timeout": solver_timeout,
+            "solver_batch_size": solver_batch_size,
+            "candidate_count": candidate_count,
+            "max_slots": max_slots,
+            "grid_format": grid_format,
+            "stream": stream,
+            "early_stop": early_stop,
+            "solver_memo": solver_memo,
+            "max_candidates": max_candidates,
+            "wordlist_solver": wordlist_solver,
+            "fill_mode": fill_mode,
+            "theme_words": theme_words,
+            "hedge_percentile": hedge_percentile,
+            "backtrack_depth": backtrack_depth,
+            "max_generation_calls": max_generation_calls,
+            "region_size": region_size,
+            "structured": structured,
+            "seed": seed,
+        },
+    )
+    checkpoint = Checkpoint(output_dir, resume, overwrite)
+    checkpoint.start(
+        grid_size=grid_size,
+        word_count=word_count,
+        desired_difficulty=desired_difficulty,
+        fill_mode=fill_mode,
+    )
+
+    crossword = checkpoint.generated()
+    if crossword is not None:
+        print(f"RESUMED the generated crossword from {checkpoint.path}")
+    elif fill_mode == "wordlist":
+        crossword, _ = generate_filled(
+            llm,
+            grid_size,
+            word_count,
+            desired_difficulty,
+            word_index or load_word_index(),
+            theme_words,
+            verbose,
+            output_dir,
+            structured,
+            seed,
+        )
+    else:
+        crossword, _ = generate(
+            llm,
+            grid_size,
+            word_count,
+            desired_difficulty,
+            candidate_count,
+            max_slots,
+            grid_format,
+            verbose,
+            stream,
+            output_dir,
+            attempt_llms,
+            hedge_percentile,
+            checkpoint,
+            backtrack_depth,
+            max_generation_calls,
+            region_size,
+            structured,
+            seed,
+        )
+    checkpoint.generated(crossword)
 
     # remove this - here for testing
     # output_file = "crossword.json"
@@ -274,39 +1156,106 @@ def generate_crossword(
     # with open(output_file, "r") as f:
     #     crossword = json.load(f)
 
-    for i in range(iterations):
-        iteration = i + 1
+    # per solver model, the guesses for clues it was already asked
+    memos = {} if solver_memo else None
+
+    solvers = list(solvers or solver_configs)
+    if wordlist_solver:
+        solvers.append({"model": WORDLIST_SOLVER_MODEL})
+    if solver_stats is not None and solver_policy is not None:
+        solvers = select_solvers(solvers, solver_stats, solver_policy, checkpoint)
+
+    first_iteration = 1
+    last = checkpoint.last_iteration()
+    if last:
+        crossword = last["crossword"]
+        first_iteration = last["iteration"] + 1
+        print(f"RESUMED after iteration {last['iteration']}")
+        if last["finished"]:
+            checkpoint.finish()
+            checkpoint.close()
+            return crossword
+
+    for iteration in range(first_iteration, iterations + 1):
+        checkpoint.iteration = iteration
         print("*" * 50)
         print(f"ITERATION: {iteration}")
 
-        # Create a process pool
-        with Pool(processes=multiprocessing.cpu_count()) as pool:
-            # Use partial to pass common arguments to solve_wrapper
-            solve_func = partial(
-                solve_wrapper,
-                grid_size=grid_size,
-                output_file=output_file,
-                verbose=verbose,
+        # solvers that finished before the run was resumed are not asked
+        # again, and the clues the others already answered are reused
+        done = checkpoint.solver_responses(iteration)
+        for remembered in range(1 if solver_memo else iteration, iteration + 1):
+            for solver_model, guesses in checkpoint.solver_guesses(remembered).items():
+                if memos is None:
+                    memos = {}
+                memos.setdefault(solver_model, {}).update(guesses)
+        if done:
+            print(f"RESUMED {len(done)} solver response(s): {list(done)}")
+
+        # Run every solver concurrently on the in-memory puzzle, optionally
+        # stopping once the remaining solvers cannot change the clue updates
+        stop_when = None
+        if early_stop:
+            stop_when = lambda responses, pending: clue_updates_decided(
+                crossword, list(done.values()) + responses, pending, desired_difficulty
             )
-            responses = list(pool.imap_unordered(solve_func, solver_configs))
+        responses = list(done.values())
+        pending_solvers = [config for config in solvers if config["model"] not in done]
+        transcript_event(
+            "solve", iteration=iteration, crossword=crossword, solvers=solvers
+        )
+        if pending_solvers:
+            responses += get_solver_service().run(
+                run_solvers,
+                crossword,
+                grid_size,
+                verbose,
+                solver_concurrency,
+                solver_timeout,
+                pending_solvers,
+                stop_when,
+                memos,
+                checkpoint,
+                batch_size=solver_batch_size,
+                grid_format=grid_format,
+                stream=stream,
+                word_index=word_index,
+                max_candidates=max_candidates,
+                region_size=region_size,
+                structured=structured,
+            )
+        if not solver_memo:
+            memos = None
+        if not responses:
+            print("No solver responses received, stopping revisions")
+            break
+
+        if solver_stats is not None:
+            solver_stats.record(responses)
 
         # get metrics and update clues
-        print_puzzle_acc(crossword, responses, model, desired_difficulty)
-        solve_perc = get_word_perc(crossword, responses)
-        update_clue = determine_clue_updates_needed(
-            crossword, solve_perc, desired_difficulty
+        solve_perc, update_clue = score_responses(
+            crossword, responses, model, desired_difficulty, iteration
         )
 
+        clue_update_words = []
         if update_clue:
             # filter out all the words that need a clue update
             clue_update_words = [word for word in update_clue if update_clue[word]]
             print(f"CLUE UPDATES NEEDED FOR: {clue_update_words}")
 
             # update the clues for needed words
-            update_crossword(llm, crossword, clue_update_words, desired_difficulty)
+            update_crossword(
+                llm,
+                crossword,
+                clue_update_words,
+                desired_difficulty,
+                structured=structured,
+                verbose=verbose,
+            )
 
-        output_file = f"output/crossword-{iteration}.json"
-        write_file(crossword, iteration)
+        write_file(crossword, iteration, verbose, output_dir)
+        checkpoint.iteration_done(crossword, clue_update_words, not update_clue)
 
         if not update_clue:
             print(
@@ -314,12 +1263,16 @@ def generate_crossword(
             )
             break
 
+    checkpoint.finish()
+    checkpoint.close()
+    return crossword
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Crossword Puzzle Generator")
     parser.add_argument(
         "--gen_model",
-        choices=["claude", "gpt", "llama", "mistral"],
+        choices=list(GEN_MODELS),
         default="gpt",
         help="Choose the model to use for generating the crossword puzzle",
     )
@@ -348,7 +1301,245 @@ if __name__ == "__main__":
         help="Number of times the crossword should be revised",
     )
     parser.add_argument(
-        "--verbose", action="store_true", help="Enable verbose output for SolverLLMs"
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output for the PuzzleLLM and SolverLLMs",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="Ranked candidate placements the PuzzleLLM proposes per call",
+    )
+    parser.add_argument(
+        "--slot_index",
+        action="store_true",
+        help="Give the PuzzleLLM the index of open slots it can place the new word in",
+    )
+    parser.add_argument(
+        "--max_slots",
+        type=int,
+        default=0,
+        help="Maximum number of open slots included in the prompt (0 for all)",
+    )
+    parser.add_argument(
+        "--grid_format",
+        choices=list(GRID_ENCODERS),
+        default="dicts",
+        help="How the filled grid is written into the PuzzleLLM and SolverLLM prompts",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses, stop at the answer JSON and abandon illegal placements early",
+    )
+    parser.add_argument(
+        "--solver_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of SolverLLMs running at once (defaults to all)",
+    )
+    parser.add_argument(
+        "--solver_timeout",
+        type=float,
+        default=None,
+        help="Seconds after which a SolverLLM's attempt is abandoned",
+    )
+    parser.add_argument(
+        "--early_stop",
+        action="store_true",
+        help="Cancel the remaining SolverLLMs once their results cannot change the clue updates",
+    )
+    parser.add_argument(
+        "--solver_memo",
+        action="store_true",
+        help="Reuse each SolverLLM's results for clues unchanged since the last iteration",
+    )
+    parser.add_argument(
+        "--wordlist",
+        default=None,
+        help="Wordlist file used to fill forced clues and give SolverLLMs candidate words",
+    )
+    parser.add_argument(
+        "--wordlist_candidates",
+        type=int,
+        default=10,
+        help="Largest candidate list included for a clue in the SolverLLM prompt",
+    )
+    parser.add_argument(
+        "--wordlist_solver",
+        action="store_true",
+        help="Add a solver that fills the puzzle from the wordlist without any LLM",
+    )
+    parser.add_argument(
+        "--fill_mode",
+        choices=["llm", "wordlist"],
+        default="llm",
+        help="Place words with the PuzzleLLM, or fill the grid from the wordlist and only ask it for clues",
+    )
+    parser.add_argument(
+        "--theme_words",
+        nargs="+",
+        default=None,
+        help="Words the wordlist filler places first wherever they fit; requires --fill_mode wordlist",
+    )
+    parser.add_argument(
+        "--parallel_attempts",
+        type=int,
+        default=1,
+        help="Generation requests sent at once for every word, the first fitting word wins",
+    )
+    parser.add_argument(
+        "--attempt_models",
+        nargs="+",
+        choices=list(GEN_MODELS),
+        default=None,
+        help="Models the parallel attempts cycle through (defaults to --gen_model)",
+    )
+    parser.add_argument(
+        "--attempt_temperatures",
+        type=float,
+        nargs="+",
+        default=None,
+        help="Temperatures the parallel attempts cycle through",
+    )
+    parser.add_argument(
+        "--hedge_percentile",
+        type=float,
+        default=None,
+        help="Resend a generation request that is slower than this percentile of recent ones, e.g. 95",
+    )
+
+    parser.add_argument(
+        "--structured_output",
+        action="store_true",
+        help="Ask every LLM call for a tool call following a schema instead of scraping JSON from its text",
+    )
+    parser.add_argument(
+        "--solver_batch_size",
+        type=int,
+        default=1,
+        help="Clues each SolverLLM answers per call, 0 asks for all remaining clues at once",
+    )
+    parser.add_argument(
+        "--fake_solvers",
+        action="store_true",
+        help="Use the offline fake SolverLLMs from configs/fake.py",
+    )
+    parser.add_argument(
+        "--output_dir",
+        default="output",
+        help="Directory the crossword JSON of every iteration is written to",
+    )
+    parser.add_argument(
+        "--region_size",
+        type=int,
+        default=None,
+        help="On grids larger than this, send each generation and solver call only this size square of the grid",
+    )
+    parser.add_argument(
+        "--backtrack_depth",
+        type=int,
+        default=0,
+        help="Remove up to this many recent words at once when generation hits a dead end (0 gives up instead)",
+    )
+    parser.add_argument(
+        "--max_generation_calls",
+        type=int,
+        default=None,
+        help=f"Generation requests allowed for the whole puzzle ({CALLS_PER_WORD} per word when backtracking)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the run whose checkpoint log is in --output_dir instead of starting over",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Start over even if --output_dir holds the checkpoint log of an unfinished run",
+    )
+    parser.add_argument(
+        "--solver_stats",
+        default=None,
+        help="JSON file that every SolverLLM's latency, token cost and agreement with the others is added to",
+    )
+    parser.add_argument(
+        "--adaptive_solvers",
+        action="store_true",
+        help=f"Only ask the SolverLLMs the stats say are worth their cost (stats default to {DEFAULT_STATS_PATH})",
+    )
+    parser.add_argument(
+        "--target_confidence",
+        type=float,
+        default=DEFAULT_POLICY["target_confidence"],
+        help="Leave out a SolverLLM when two picked ones predict at least this share of its votes",
+    )
+    parser.add_argument(
+        "--solver_cost_budget",
+        type=float,
+        default=DEFAULT_POLICY["max_cost"],
+        help="Mean USD the picked SolverLLMs may cost per iteration",
+    )
+    parser.add_argument(
+        "--solver_latency_budget",
+        type=float,
+        default=DEFAULT_POLICY["max_latency_s"],
+        help="Leave out SolverLLMs whose mean seconds per iteration are above this",
+    )
+    parser.add_argument(
+        "--min_solvers",
+        type=int,
+        default=DEFAULT_POLICY["min_solvers"],
+        help="SolverLLMs asked at least, whatever the budgets",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="JSONL file that every LLM call and grid validation is appended to",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the region choices and the wordlist filler, recorded in the transcript",
+    )
+    parser.add_argument(
+        "--transcript",
+        default=None,
+        help="Gzipped JSONL file every prompt and response of the run is recorded to, for replay.py",
+    )
+    parser.add_argument(
+        "--cache_path",
+        default=None,
+        help="SQLite file used to cache LLM responses (caching is off without it)",
+    )
+    parser.add_argument(
+        "--cache_max_entries",
+        type=int,
+        default=None,
+        help="Maximum number of cached responses before the least recently used are evicted",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=None,
+        help="Seconds after which a cached response expires",
+    )
+    parser.add_argument(
+        "--cache_deterministic_only",
+        action="store_true",
+        help="Only cache responses of models running at temperature 0",
+    )
+    parser.add_argument(
+        "--no_rate_limits",
+        action="store_true",
+        help="Do not throttle LLM calls to the limits in configs/rate_limits.py",
+    )
+    parser.add_argument(
+        "--rate_limit_db",
+        default=None,
+        help="SQLite file that shares the request and token budgets with other processes",
     )
 
     args = parser.parse_args()
@@ -356,27 +1547,53 @@ if __name__ == "__main__":
     if args.grid_size < 10:
         parser.error("grid_size must be at least 10.")
 
+    if args.theme_words and args.fill_mode != "wordlist":
+        parser.error("--theme_words requires --fill_mode wordlist.")
+
+    if not args.resume and not args.overwrite and unfinished_log(args.output_dir):
+        parser.error(
+            f"{args.output_dir} holds the checkpoint log of an unfinished run, "
+            "continue it with --resume or start over with --overwrite."
+        )
+
     print(
         f"GENERATING crossword using: {args.gen_model}, grid size: {args.grid_size}, word count: {args.word_count}, "
         f"difficulty: {args.difficulty}"
     )
 
-    generator_config = {
-        "temperature": 1,
-        "max_tokens": 4096,
-        "timeout": None,
-        "max_retries": 4,
-    }
+    if args.trace:
+        set_tracer(Tracer(args.trace))
+
+    if args.cache_path:
+        set_llm_cache(
+            SQLiteCache(
+                args.cache_path,
+                max_entries=args.cache_max_entries,
+                ttl=args.cache_ttl,
+            ),
+            deterministic_only=args.cache_deterministic_only,
+        )
+
+    if not args.no_rate_limits:
+        set_rate_limits(rate_limits, args.rate_limit_db)
+
+    if args.transcript:
+        set_transcript_recording(True)
+        current_transcript.set(TranscriptWriter(args.transcript))
 
-    model = "gpt-4o"
-    if args.gen_model == "claude":
-        model = "claude-3-5-sonnet-latest"
-    elif args.gen_model == "llama":
-        model = "llama-3.3-70b-versatile"
-    elif args.gen_model == "mistral":
-        model = "mistral"
+    generator_config = get_generator_config(args.gen_model)
+    model = generator_config["model"]
 
-    generator_config["model"] = model
+    solver_stats = solver_policy = None
+    if args.solver_stats or args.adaptive_solvers:
+        solver_stats = SolverStats(args.solver_stats or DEFAULT_STATS_PATH)
+    if args.adaptive_solvers:
+        solver_policy = {
+            "target_confidence": args.target_confidence,
+            "max_cost": args.solver_cost_budget,
+            "max_latency_s": args.solver_latency_budget,
+            "min_solvers": args.min_solvers,
+        }
 
     generate_crossword(
         get_llm(generator_config),
@@ -385,5 +1602,48 @@ if __name__ == "__main__":
         args.difficulty,
         args.iterations,
         args.verbose,
-        model
+        model,
+        args.solver_concurrency,
+        args.solver_timeout,
+        fake_solver_configs if args.fake_solvers else None,
+        args.solver_batch_size,
+        args.candidates,
+        args.max_slots if args.slot_index else None,
+        args.grid_format,
+        args.stream,
+        args.early_stop,
+        args.solver_memo,
+        load_word_index(args.wordlist) if args.wordlist else None,
+        args.wordlist_candidates,
+        args.wordlist_solver,
+        args.fill_mode,
+        args.theme_words,
+        args.output_dir,
+        (
+            get_attempt_llms(
+                args.gen_model,
+                args.parallel_attempts,
+                args.attempt_models,
+                args.attempt_temperatures,
+            )
+            if args.parallel_attempts > 1
+            else None
+        ),
+        args.hedge_percentile,
+        args.resume,
+        args.overwrite,
+        args.backtrack_depth,
+        args.max_generation_calls,
+        args.region_size,
+        solver_stats,
+        solver_policy,
+        args.structured_output,
+        args.seed,
     )
+
+    if args.transcript:
+        current_transcript.get().close()
+
+    if args.trace:
+        get_tracer().print_summary()
+        get_tracer().close()
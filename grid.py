@@ -0,0 +1,300 @@
+class CharacterConflictException(Exception):
+    def __init__(self, row, column, existing_char):
+        self.row = row
+        self.column = column
+        self.existing_char = existing_char
+        message = (
+            f"CONFLICT - Row: {row}, Column: {column}, Existing: '{existing_char}'"
+        )
+        super().__init__(message)
+
+
+class OutOfBoundsException(Exception):
+    def __init__(self, row, column):
+        self.row = row
+        self.column = column
+        super().__init__(f"OUT OF BOUNDS - Row: {row}, Column: {column}")
+
+
+class Grid:
+    """
+    Array-backed crossword state.
+
+    Cells live in a preallocated row-major list and every cell keeps a count
+    of the words covering it, so placing or undoing a word only touches the
+    cells of that word instead of re-walking the whole puzzle.
+    """
+
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        self.cells = [None] * (grid_size * grid_size)
+        self.counts = [0] * (grid_size * grid_size)
+        self.across_counts = [0] * (grid_size * grid_size)
+        self.down_counts = [0] * (grid_size * grid_size)
+        self.entries = []
+        self.words = []
+        self.char_positions = []
+        self._slot_index = None
+
+    @classmethod
+    def from_json(cls, words_json, grid_size):
+        grid = cls(grid_size)
+        for word_d in words_json["words"]:
+            grid.place(word_d)
+        return grid
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, row, column):
+        return self.cells[row * self.grid_size + column]
+
+    def in_bounds(self, row, column):
+        return 0 <= row < self.grid_size and 0 <= column < self.grid_size
+
+    def is_empty(self, row, column):
+        return (
+            not self.in_bounds(row, column)
+            or self.cells[row * self.grid_size + column] is None
+        )
+
+    def cell_positions(self, word_d):
+        row, column = int(word_d["row"]), int(word_d["column"])
+        d_row, d_column = (0, 1) if word_d["isAcross"] else (1, 0)
+        return [
+            (row + i * d_row, column + i * d_column) for i in range(len(word_d["word"]))
+        ]
+
+    def check(self, word_d):
+        """
+        Raises the first conflict or bounds error the word would cause,
+        without modifying the grid.
+        """
+        for char, (row, column) in zip(word_d["word"], self.cell_positions(word_d)):
+            if not self.in_bounds(row, column):
+                raise OutOfBoundsException(row=row, column=column)
+            existing_char = self.cells[row * self.grid_size + column]
+            if existing_char is not None and existing_char != char:
+                raise CharacterConflictException(
+                    row=row, column=column, existing_char=existing_char
+                )
+
+    def place(self, word_d):
+        self.check(word_d)
+
+        direction_counts = self.across_counts if word_d["isAcross"] else self.down_counts
+        for char, (row, column) in zip(word_d["word"], self.cell_positions(word_d)):
+            index = row * self.grid_size + column
+            self.cells[index] = char
+            self.counts[index] += 1
+            direction_counts[index] += 1
+            self.char_positions.append(
+                {"row": row, "column": column, "character": char}
+            )
+
+        self.entries.append(word_d)
+        self.words.append(word_d["word"])
+        if self._slot_index is not None:
+            self._slot_index.refresh(word_d)
+
+    def undo(self):
+        word_d = self.entries.pop()
+        self.words.pop()
+
+        direction_counts = self.across_counts if word_d["isAcross"] else self.down_counts
+        for row, column in self.cell_positions(word_d):
+            index = row * self.grid_size + column
+            self.counts[index] -= 1
+            direction_counts[index] -= 1
+            if not self.counts[index]:
+                self.cells[index] = None
+
+        del self.char_positions[len(self.char_positions) - len(word_d["word"]) :]
+        if self._slot_index is not None:
+            self._slot_index.refresh(word_d)
+        return word_d
+
+    def slot_index(self):
+        """
+        Returns the open-slot index for this grid, building it on first use
+        and keeping it up to date on every later place/undo.
+        """
+        if self._slot_index is None:
+            self._slot_index = SlotIndex(self)
+        return self._slot_index
+
+    def snapshot(self):
+        return list(self.char_positions), list(self.words)
+
+    def to_json(self):
+        return {"words": list(self.entries)}
+
+    def render(self, empty="_"):
+        lines = []
+        for i in range(self.grid_size):
+            row = self.cells[i * self.grid_size : (i + 1) * self.grid_size]
+            lines.append(" ".join(char if char else empty for char in row) + " ")
+        return "\n".join(lines)
+
+
+MIN_WORD_LENGTH = 3
+
+
+def format_lengths(lengths):
+    ranges = []
+    start = previous = lengths[0]
+    for length in lengths[1:] + [None]:
+        if length is not None and length == previous + 1:
+            previous = length
+            continue
+        ranges.append(f"{start}-{previous}" if start != previous else str(start))
+        if length is not None:
+            start = previous = length
+    return ",".join(ranges)
+
+
+class Slot:
+    def __init__(self, row, column, is_across, lengths, pattern):
+        self.row = row
+        self.column = column
+        self.is_across = is_across
+        self.lengths = lengths
+        self.pattern = pattern
+
+    def __repr__(self):
+        return self.describe()
+
+    def describe(self):
+        direction = "across" if self.is_across else "down"
+        return (
+            f"({self.row},{self.column},{direction},"
+            f"len {format_lengths(self.lengths)},pattern {self.pattern})"
+        )
+
+    def fits(self, word):
+        return len(word) in self.lengths and all(
+            fixed in ("?", char) for fixed, char in zip(self.pattern, word)
+        )
+
+
+class SlotIndex:
+    """
+    Index of the open slots of a grid: every start cell and direction where
+    a new word of MIN_WORD_LENGTH or more letters could cross the existing
+    words without a conflict, without running into the end or side of
+    another word and without overlapping a word going the same way. An
+    empty grid has no slots since any placement is open.
+
+    Slots are kept per line (a row for across slots, a column for down
+    slots) so that a placement only recomputes the lines next to it.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.lines = {}
+        for index in range(grid.grid_size):
+            self._compute_line(True, index)
+            self._compute_line(False, index)
+
+    def __len__(self):
+        return sum(len(slots) for slots in self.lines.values())
+
+    def slots(self):
+        return [slot for slots in self.lines.values() for slot in slots]
+
+    def refresh(self, word_d):
+        row, column = int(word_d["row"]), int(word_d["column"])
+        length = len(word_d["word"])
+        if len(self.grid.entries) <= 1:
+            # nothing to cross on an empty grid, and every line may cross the
+            # first word, so rebuild the whole index
+            self.__init__(self.grid)
+            return
+
+        if word_d["isAcross"]:
+            along, first, last = True, column - 1, column + length
+            nearby = range(row - 1, row + 2)
+        else:
+            along, first, last = False, row - 1, row + length
+            nearby = range(column - 1, column + 2)
+
+        for index in nearby:
+            self._compute_line(along, index)
+        for index in range(first, last + 1):
+            self._compute_line(not along, index)
+
+    def _cell(self, is_across, line, offset):
+        return (line, offset) if is_across else (offset, line)
+
+    def _compute_line(self, is_across, line):
+        grid = self.grid
+        size = grid.grid_size
+        if not 0 <= line < size:
+            return
+
+        direction_counts = grid.across_counts if is_across else grid.down_counts
+        side = (1, 0) if is_across else (0, 1)
+        slots = []
+
+        for start in range(size - MIN_WORD_LENGTH + 1):
+            if not grid.is_empty(*self._cell(is_across, line, start - 1)):
+                continue
+
+            pattern = []
+            lengths = []
+            crossings = 0
+            for offset in range(start, size):
+                row, column = self._cell(is_across, line, offset)
+                index = row * size + column
+                char = grid.cells[index]
+                if direction_counts[index]:
+                    break
+                if char is None and not (
+                    grid.is_empty(row - side[0], column - side[1])
+                    and grid.is_empty(row + side[0], column + side[1])
+                ):
+                    break
+
+                pattern.append(char or "?")
+                crossings += 1 if char else 0
+                length = offset - start + 1
+                if (
+                    length >= MIN_WORD_LENGTH
+                    and 0 < crossings < length
+                    and grid.is_empty(*self._cell(is_across, line, offset + 1))
+                ):
+                    lengths.append(length)
+
+            if lengths:
+                slots.append(
+                    Slot(
+                        *self._cell(is_across, line, start),
+                        is_across,
+                        lengths,
+                        "".join(pattern[: lengths[-1]]),
+                    )
+                )
+
+        self.lines[(is_across, line)] = slots
+
+    def describe(self, limit=None, region=None):
+        """
+        Compact text form of the index for prompts, listing the most
+        flexible slots first. With a region, only the slots starting in it
+        are listed.
+        """
+        if not self.grid.entries:
+            return "any"
+        slots = [
+            slot
+            for slot in self.slots()
+            if region is None or region.contains(slot.row, slot.column)
+        ]
+        if not slots:
+            return "none"
+
+        slots = sorted(
+            slots,
+            key=lambda slot: (-len(slot.lengths), slot.row, slot.column),
+        )
+        return "\n".join(slot.describe() for slot in slots[:limit])
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from collections import defaultdict, deque
+from tracing import percentile
+
+# recent latencies kept per model to estimate its latency percentiles
+LATENCY_WINDOW = 100
+MIN_LATENCY_SAMPLES = 5
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent calls per model, used to decide when a
+    call has been running long enough to be worth hedging.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW, min_samples=MIN_LATENCY_SAMPLES):
+        self.min_samples = min_samples
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._latencies[model].append(seconds)
+
+    def threshold(self, model, fraction):
+        """
+        The given latency percentile of the model, or None until enough
+        calls have been seen to estimate it.
+        """
+        with self._lock:
+            latencies = list(self._latencies[model])
+        if len(latencies) < self.min_samples:
+            return None
+        return percentile(latencies, fraction)
+
+
+latency_tracker = LatencyTracker()
+
+_loops = threading.local()
+
+
+def run_async(coroutine):
+    """
+    Runs a coroutine on an event loop kept for the calling thread, so that
+    async clients reused between calls always see the same loop.
+    """
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coroutine)
+
+
+async def first_accepted(attempts, accept, hedge=None, hedge_after=None):
+    """
+    Starts every attempt (a function returning a coroutine) at once and
+    returns the first result that accept() turns into a truthy value,
+    cancelling the attempts still running. If none has been accepted
+    hedge_after seconds in, hedge() is started as one more attempt.
+
+    Returns None when every attempt finished without an accepted result,
+    and re-raises the first error if all of them failed.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + hedge_after if hedge and hedge_after is not None else None
+    started = [asyncio.ensure_future(attempt()) for attempt in attempts]
+    pending = set(started)
+    errors = []
+    finished = 0
+    try:
+        while pending:
+            timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                started.append(asyncio.ensure_future(hedge()))
+                pending.add(started[-1])
+                deadline = None
+                continue
+            # attempts finishing together are looked at in the order they
+            # were started, so the same responses always place the same word
+            for task in sorted(done, key=started.index):
+                finished += 1
+                if task.exception():
+                    errors.append(task.exception())
+                    continue
+                accepted = accept(task.result())
+                if accepted:
+                    return accepted
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if errors and len(errors) == finished:
+        raise errors[0]
+    return None
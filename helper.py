@@ -1,9 +1,12 @@
 import json
 from enum import Enum
+from functools import lru_cache
 import os
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain_anthropic import ChatAnthropic
+from grid import Grid, CharacterConflictException
+from cache import wrap_with_cache
+from ratelimit import provider_for, wrap_with_rate_limit
+from structured import StructuredOutputLLM
+from transcript import ReplayLLM, replaying, wrap_with_transcript
 
 
 class Difficulty(Enum):
@@ -12,24 +15,6 @@ class Difficulty(Enum):
     HARD = "hard"
 
 
-class CharacterConflictException(Exception):
-    def __init__(self, row, column, existing_char):
-        self.row = row
-        self.column = column
-        self.existing_char = existing_char
-        message = (
-            f"CONFLICT - Row: {row}, Column: {column}, Existing: '{existing_char}'"
-        )
-        super().__init__(message)
-
-
-class OutOfBoundsException(Exception):
-    def __init__(self, row, column):
-        self.row = row
-        self.column = column
-        super().__init__(f"OUT OF BOUNDS - Row: {row}, Column: {column}")
-
-
 class FieldsMissingException(Exception):
     def __init__(self, field):
         self.field = field
@@ -37,65 +22,68 @@ class FieldsMissingException(Exception):
 
 
 def get_llm(config):
-    if "gpt" in config.get("model"):
-        return ChatOpenAI(**config)
-    elif "claude" in config.get("model"):
-        return ChatAnthropic(**config, anthropic_api_key=os.getenv("CLAUDE_API_KEY"))
+    if replaying():
+        return ReplayLLM(config)
+    # provider packages take most of the start-up time, so each is only
+    # imported once a client for it is needed
+    provider = provider_for(config.get("model"))
+    if provider == "fake":
+        from fake_llm import FakeChatModel
+
+        llm = FakeChatModel(**config)
+    elif provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        llm = ChatOpenAI(**config)
+    elif provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+
+        llm = ChatAnthropic(**config, anthropic_api_key=os.getenv("CLAUDE_API_KEY"))
     else:
-        return ChatGroq(**config)
+        from langchain_groq import ChatGroq
+
+        llm = ChatGroq(**config)
+    llm = StructuredOutputLLM(llm, provider)
+    # cache hits are answered before they count against the rate limits, and
+    # recorded in a transcript like any other response
+    return wrap_with_transcript(
+        wrap_with_cache(wrap_with_rate_limit(llm, config), config), config
+    )
 
 
-def write_file(crossword, iteration):
+def write_file(crossword, iteration, verbose=False, output_dir="output"):
     json_s = json.dumps(crossword, indent=4)
-    print(f"[ITERATION {iteration}] Crossword Puzzle:  \n{json_s}")
-    output_file = f"output/crossword-{iteration}.json"
+    vprint(verbose, f"[ITERATION {iteration}] Crossword Puzzle:  \n{json_s}")
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"crossword-{iteration}.json")
     with open(output_file, "w") as f:
         f.write(json_s)
+    return output_file
 
 
+@lru_cache(maxsize=None)
 def read_prompt_template(file_path):
     with open(file_path, "r") as file:
         return file.read()
 
 
+def chat_prompt(system_template, human_template):
+    # langchain_core.prompts is slow to import, so only the first prompt
+    # built pays for it
+    from langchain_core.messages import SystemMessage
+    from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessage(content=system_template),
+            HumanMessagePromptTemplate.from_template(human_template),
+        ]
+    )
+
+
 def get_character_positions_and_words(words_json, grid_size):
-    char_positions = []
-    words = []
-    position_map = {}
-
-    for data in words_json["words"]:
-        word = data["word"]
-        words.append(word)
-        is_across = True if data["isAcross"] else False
-        row, column = data["row"], data["column"]
-
-        for i, char in enumerate(word):
-            pos_key = (row, column)
-            if pos_key in position_map:
-                existing_char = position_map[pos_key]
-                if existing_char != char:
-                    raise CharacterConflictException(
-                        row=row,
-                        column=column,
-                        existing_char=existing_char,
-                    )
-            elif row >= grid_size or column >= grid_size:
-                raise OutOfBoundsException(
-                    row=row,
-                    column=column,
-                )
-            else:
-                position_map[pos_key] = char
-
-            char_positions.append(
-                {"row": int(row), "column": int(column), "character": char}
-            )
-
-            if is_across:
-                column += 1
-            else:
-                row += 1
-    return char_positions, words
+    grid = Grid.from_json(words_json, grid_size)
+    return grid.char_positions, grid.words
 
 
 def print_char_positions_and_words(char_positions, words):
@@ -108,6 +96,9 @@ def print_char_positions_and_words(char_positions, words):
     print("*" * 50)
 
 
+NECESSARY_WORD_FIELDS = ["row", "column", "isAcross", "clue", "positions"]
+
+
 def vprint(verbose, s):
     if verbose:
         print(s)
@@ -128,9 +119,8 @@ def extract_json_from_text(text):
         # Validate that it's valid JSON by parsing it
         data = json.loads(json_text)
 
-        necessary_fields = ["row", "column", "isAcross", "clue", "positions"]
         if "message" not in data:
-            for field in necessary_fields:
+            for field in NECESSARY_WORD_FIELDS:
                 if field not in data:
                     raise FieldsMissingException(field)
 
@@ -143,6 +133,61 @@ def extract_json_from_text(text):
         return "Error: No valid JSON found at the end of the text"
 
 
+def parse_outcome(data):
+    if isinstance(data, FieldsMissingException):
+        return "missing_field"
+    if isinstance(data, str):
+        return "invalid_json"
+    if data.get("message"):
+        return "no_word"
+    return "ok"
+
+
+def rejection_reason(exception):
+    if isinstance(exception, CharacterConflictException):
+        return "conflict"
+    return "out_of_bounds"
+
+
+def extract_json_object(text):
+    """
+    Extracts the last top-level JSON object in the input text, which may
+    contain nested objects and lists.
+    """
+    decoder = json.JSONDecoder()
+    data = None
+    index = text.find("{")
+    while index != -1:
+        try:
+            data, end = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            index = text.find("{", index + 1)
+        else:
+            index = text.find("{", end)
+
+    if data is None:
+        return "Error: No valid JSON found in the text"
+    return data
+
+
+def extract_candidates_from_text(text):
+    """
+    Extracts the ranked candidate words from the JSON at the end of the
+    input text, skipping candidates with missing fields.
+    """
+    data = extract_json_object(text)
+    if not isinstance(data, dict) or not isinstance(data.get("candidates"), list):
+        return []
+
+    return [
+        candidate
+        for candidate in data["candidates"]
+        if isinstance(candidate, dict)
+        and "word" in candidate
+        and all(field in candidate for field in NECESSARY_WORD_FIELDS)
+    ]
+
+
 def return_clue_metadata(crossword):
     ret_list = []
     solution = {}
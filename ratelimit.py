@@ -0,0 +1,314 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from tokens import count_message_tokens
+from tracing import get_tracer
+
+
+def provider_for(model):
+    if model.startswith("fake"):
+        return "fake"
+    if "gpt" in model:
+        return "openai"
+    if "claude" in model:
+        return "anthropic"
+    return "groq"
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key, attempts):
+        self.key = key
+        self.attempts = attempts
+        super().__init__(f"RATE LIMITED - {key}: still throttled after {attempts} attempts")
+
+
+def is_rate_limit_error(e):
+    status = getattr(e, "status_code", None) or getattr(
+        getattr(e, "response", None), "status_code", None
+    )
+    return status == 429 or "RateLimit" in type(e).__name__
+
+
+def retry_after(e):
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_min units per minute up to capacity. reserve() takes
+    the units right away, letting the bucket go into debt, and returns how
+    long the caller has to wait before the units are really available.
+    """
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60
+        self.capacity = capacity or rate_per_min
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class SQLiteTokenBucket:
+    """
+    TokenBucket whose state lives in a SQLite file, so every process using
+    the same file draws from the same budget.
+    """
+
+    def __init__(self, path, key, rate_per_min, capacity=None):
+        self.key = key
+        self.rate = rate_per_min / 60
+        self.capacity = capacity or rate_per_min
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def reserve(self, amount):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE key = ?", (self.key,)
+                ).fetchone()
+                tokens, updated_at = row or (self.capacity, now)
+                tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+                tokens -= min(amount, self.capacity)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                    (self.key, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return max(0.0, -tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    Limits one provider/model to requests_per_min and tokens_per_min with
+    token buckets and to max_in_flight concurrent calls, and retries calls
+    rejected with a 429 using exponential backoff with jitter.
+    """
+
+    def __init__(
+        self,
+        key,
+        requests_per_min=None,
+        tokens_per_min=None,
+        max_in_flight=None,
+        max_attempts=6,
+        base_delay=1.0,
+        max_delay=60.0,
+        output_tokens=500,
+        db_path=None,
+    ):
+        self.key = key
+        # "requests" or "tokens" -> bucket
+        self.buckets = {}
+        for kind, rate in (("requests", requests_per_min), ("tokens", tokens_per_min)):
+            if rate:
+                self.buckets[kind] = (
+                    SQLiteTokenBucket(db_path, f"{key}:{kind}", rate)
+                    if db_path
+                    else TokenBucket(rate)
+                )
+        self.in_flight = threading.Semaphore(max_in_flight) if max_in_flight else None
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_tokens = output_tokens
+        self.throttled = 0
+
+    def _delay(self, messages):
+        delay = 0.0
+        if "requests" in self.buckets:
+            delay = self.buckets["requests"].reserve(1)
+        if "tokens" in self.buckets:
+            # a call spends its prompt plus the reply it is expected to get
+            tokens = count_message_tokens(messages) + self.output_tokens
+            delay = max(delay, self.buckets["tokens"].reserve(tokens))
+        return delay
+
+    def _backoff(self, e, attempt):
+        self.throttled += 1
+        if attempt + 1 >= self.max_attempts:
+            raise RateLimitExceeded(self.key, self.max_attempts) from e
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        delay = retry_after(e) or delay * random.uniform(0.5, 1.0)
+        get_tracer().emit("rate_limited", model=self.key, attempt=attempt, delay_s=delay)
+        return delay
+
+    def release(self):
+        if self.in_flight:
+            self.in_flight.release()
+
+    def call(self, fn, messages, keep_slot=False):
+        """
+        Runs fn within the limits. With keep_slot the in-flight slot stays
+        taken after a successful call until the caller releases it.
+        """
+        for attempt in range(self.max_attempts):
+            time.sleep(self._delay(messages))
+            if self.in_flight:
+                self.in_flight.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                self.release()
+                if not is_rate_limit_error(e):
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                continue
+            except BaseException:
+                # interrupted, the slot is given back all the same
+                self.release()
+                raise
+            if not keep_slot:
+                self.release()
+            return result
+
+    async def _acquire_async(self):
+        # the semaphore is shared with threads running other event loops
+        while not self.in_flight.acquire(blocking=False):
+            await asyncio.sleep(0.01)
+
+    async def acall(self, fn, messages, keep_slot=False):
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._delay(messages))
+            if self.in_flight:
+                await self._acquire_async()
+            try:
+                result = await fn()
+            except Exception as e:
+                self.release()
+                if not is_rate_limit_error(e):
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            except BaseException:
+                # cancelled by an early stop, a solver timeout or a hedged
+                # attempt winning, the slot is given back all the same
+                self.release()
+                raise
+            if not keep_slot:
+                self.release()
+            return result
+
+
+class RateLimitedLLM:
+    """
+    Wraps a chat model so every call goes through its provider/model
+    RateLimiter. Streams are retried only if the 429 arrives before the
+    first chunk.
+    """
+
+    def __init__(self, llm, limiter):
+        self.llm = llm
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def invoke(self, input, *args, **kwargs):
+        return self.limiter.call(lambda: self.llm.invoke(input, *args, **kwargs), input)
+
+    async def ainvoke(self, input, *args, **kwargs):
+        return await self.limiter.acall(
+            lambda: self.llm.ainvoke(input, *args, **kwargs), input
+        )
+
+    def stream(self, input, *args, **kwargs):
+        def first_chunk():
+            stream = self.llm.stream(input, *args, **kwargs)
+            return stream, next(stream, None)
+
+        # the in-flight slot is held until the stream is done or closed
+        stream, chunk = self.limiter.call(first_chunk, input, keep_slot=True)
+        try:
+            while chunk is not None:
+                yield chunk
+                chunk = next(stream, None)
+        finally:
+            stream.close()
+            self.limiter.release()
+
+    async def astream(self, input, *args, **kwargs):
+        async def first_chunk():
+            stream = self.llm.astream(input, *args, **kwargs)
+            return stream, await anext(stream, None)
+
+        stream, chunk = await self.limiter.acall(first_chunk, input, keep_slot=True)
+        try:
+            while chunk is not None:
+                yield chunk
+                chunk = await anext(stream, None)
+        finally:
+            await stream.aclose()
+            self.limiter.release()
+
+
+_rate_limits = {}
+_rate_limit_db = None
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def set_rate_limits(rate_limits, db_path=None):
+    """
+    rate_limits maps a provider or a model name to RateLimiter settings, a
+    model's entry taking precedence over its provider's. db_path shares the
+    request and token budgets with other processes using the same file.
+    """
+    global _rate_limits, _rate_limit_db
+    with _limiters_lock:
+        _rate_limits = rate_limits
+        _rate_limit_db = db_path
+        _limiters.clear()
+
+
+def get_rate_limiter(model):
+    provider = provider_for(model)
+    settings = _rate_limits.get(model, _rate_limits.get(provider))
+    if not settings:
+        return None
+
+    key = f"{provider}:{model}"
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(key, db_path=_rate_limit_db, **settings)
+        return _limiters[key]
+
+
+def wrap_with_rate_limit(llm, config):
+    limiter = get_rate_limiter(config["model"])
+    if limiter is None:
+        return llm
+    return RateLimitedLLM(llm, limiter)
@@ -0,0 +1,111 @@
+import random
+from collections import defaultdict
+from grid import Grid
+
+# the generation region is centred on one of this many most flexible slots
+REGION_TARGETS = 8
+
+
+class Region:
+    """
+    Rectangle of cells, bounds inclusive, in the coordinates of the full grid.
+    """
+
+    def __init__(self, top, left, bottom, right):
+        self.top = top
+        self.left = left
+        self.bottom = bottom
+        self.right = right
+
+    @classmethod
+    def around(cls, grid_size, cells, size):
+        """
+        The size x size window centred on the given cells, moved inside the
+        grid and grown to cover all of them.
+        """
+        rows = [row for row, _ in cells]
+        columns = [column for _, column in cells]
+
+        def span(low, high):
+            start = (low + high) // 2 - size // 2
+            start = max(0, min(start, grid_size - size))
+            return min(start, low), min(max(start + size - 1, high), grid_size - 1)
+
+        top, bottom = span(min(rows), max(rows))
+        left, right = span(min(columns), max(columns))
+        return cls(top, left, bottom, right)
+
+    def contains(self, row, column):
+        return self.top <= row <= self.bottom and self.left <= column <= self.right
+
+    def describe(self):
+        return f"rows {self.top}-{self.bottom}, columns {self.left}-{self.right}"
+
+
+def clue_cells(grid, clue):
+    word_d = {
+        "word": "?" * clue["length"],
+        "row": clue["row"],
+        "column": clue["column"],
+        "isAcross": clue["across"],
+    }
+    return grid.cell_positions(word_d)
+
+
+def region_view(grid, region):
+    """
+    A grid holding only the words with a cell inside the region, used to
+    encode the region for a prompt.
+    """
+    view = Grid(grid.grid_size)
+    for word_d in grid.entries:
+        if any(region.contains(*cell) for cell in grid.cell_positions(word_d)):
+            view.place(word_d)
+    return view
+
+
+def grid_summary(grid, view):
+    filled = sum(1 for char in grid.cells if char is not None)
+    return (
+        f"{len(grid.entries)} words filling {filled} of {grid.grid_size ** 2} cells, "
+        f"{len(grid.entries) - len(view.entries)} of the words lie outside the region"
+    )
+
+
+def generation_region(grid, size, rng=random):
+    """
+    The region around one of the grid's most flexible open slots, picked
+    with rng, or None when the grid is empty or has no open slot.
+    """
+    slots = sorted(
+        grid.slot_index().slots(),
+        key=lambda slot: (-len(slot.lengths), slot.row, slot.column),
+    )
+    if not grid.entries or not slots:
+        return None
+    slot = rng.choice(slots[:REGION_TARGETS])
+    word_d = {
+        "word": "?" * max(slot.lengths),
+        "row": slot.row,
+        "column": slot.column,
+        "isAcross": slot.is_across,
+    }
+    return Region.around(grid.grid_size, grid.cell_positions(word_d), size)
+
+
+def clue_regions(grid, clue_metadata, size):
+    """
+    Groups the clues by the size x size tile their start cell is in and
+    returns (region covering the group's cells, clues) per tile. Every clue
+    is in one group, so the groups can be solved at the same time; guesses
+    that clash where two regions overlap fail the usual grid check.
+    """
+    tiles = defaultdict(list)
+    for clue in clue_metadata:
+        tiles[(int(clue["row"]) // size, int(clue["column"]) // size)].append(clue)
+
+    groups = []
+    for _, clues in sorted(tiles.items()):
+        cells = [cell for clue in clues for cell in clue_cells(grid, clue)]
+        groups.append((Region.around(grid.grid_size, cells, size), clues))
+    return groups
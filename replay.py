@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from generator import (
+    TARGET_BANDS,
+    accuracy_band,
+    generate_crossword,
+    run_solvers,
+    score_responses,
+)
+from solver_service import get_solver_service
+from tracing import Tracer, set_tracer
+from transcript import ReplayLLM, Transcript, current_transcript, set_replaying
+from wordlist import DEFAULT_WORDLIST_PATH, WORDLIST_SOLVER_MODEL, load_word_index
+
+BANDS = ["low", "medium", "high"]
+
+
+def find_transcripts(paths):
+    """
+    The transcript files among paths, searching directories recursively.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(
+                glob.glob(os.path.join(path, "**", "*.jsonl.gz"), recursive=True)
+            )
+        else:
+            found.append(path)
+    return found
+
+
+@lru_cache(maxsize=None)
+def word_index_for(path):
+    return load_word_index(path)
+
+
+def replay_run(run, transcript, word_index):
+    """
+    Runs generate_crossword again with the recorded settings, every LLM call
+    answered from the transcript.
+    """
+    solves = transcript.of_type("solve")
+    # the solvers actually asked, as picked by an adaptive run
+    solvers = solves[0]["solvers"] if solves else run["solvers"]
+    solvers = [config for config in solvers if config["model"] != WORDLIST_SOLVER_MODEL]
+    attempt_llms = [ReplayLLM({"model": model}) for model in run["attempt_models"]]
+    with tempfile.TemporaryDirectory() as output_dir:
+        generate_crossword(
+            ReplayLLM({"model": run["gen_model"]}),
+            verbose=False,
+            model=run["model"],
+            solvers=solvers,
+            word_index=word_index,
+            attempt_llms=attempt_llms or None,
+            output_dir=output_dir,
+            **run["settings"],
+        )
+
+
+def rescore_run(run, transcript, word_index):
+    """
+    Solves the recorded crossword of every iteration again and scores the
+    responses, without generating or updating clues. Only the solvers that
+    answered in the recorded run are asked, so solvers an early stop
+    cancelled stay left out.
+    """
+    settings = run["settings"]
+    difficulty = settings["desired_difficulty"]
+    memos = {} if settings["solver_memo"] else None
+    answered = {
+        scored["iteration"]: scored["solvers"] for scored in transcript.of_type("scored")
+    }
+    for solve in transcript.of_type("solve"):
+        crossword = solve["crossword"]
+        solvers = [
+            config
+            for config in solve["solvers"]
+            if config["model"] in answered.get(solve["iteration"], [])
+        ]
+        if not solvers:
+            continue
+        responses = get_solver_service().run(
+            run_solvers,
+            crossword,
+            settings["grid_size"],
+            False,
+            settings["solver_concurrency"],
+            None,
+            solvers,
+            None,
+            memos,
+            batch_size=settings["solver_batch_size"],
+            grid_format=settings["grid_format"],
+            stream=settings["stream"],
+            word_index=word_index,
+            max_candidates=settings["max_candidates"],
+            region_size=settings["region_size"],
+            structured=settings["structured"],
+        )
+        if responses:
+            score_responses(crossword, responses, run["model"], difficulty, solve["iteration"])
+
+
+def puzzle_scores(scores, difficulty):
+    """
+    Accuracy and accuracy bands of a puzzle from its scored iterations: the
+    first shows how well the generated clues hit the difficulty, the last
+    where the clue revisions left it.
+    """
+    first, last = scores[0], scores[-1]
+    first_bands = Counter(accuracy_band(perc) for perc in first["perc"].values())
+    last_bands = Counter(accuracy_band(perc) for perc in last["perc"].values())
+    words = len(first["perc"]) or 1
+    target = TARGET_BANDS[difficulty]
+    return {
+        "words": len(first["perc"]),
+        "iterations": len(scores),
+        "first_accuracy": first["accuracy"],
+        "final_accuracy": last["accuracy"],
+        "met": last["finished"],
+        "bands": {band: first_bands[band] / words for band in BANDS},
+        "in_target_first": first_bands[target] / words,
+        "in_target_final": last_bands[target] / (len(last["perc"]) or 1),
+    }
+
+
+def replay_transcript(path, mode="score", wordlist=None, verbose=False):
+    """
+    Replays one transcript in this process and returns its puzzle scores.
+    With mode "recorded" the scores recorded in the transcript are read
+    instead.
+    """
+    started_at = time.perf_counter()
+    transcript = Transcript(path)
+    run = transcript.run()
+    if run is None:
+        return {"path": path, "status": "failed", "error": "no run record"}
+    difficulty = run["settings"]["desired_difficulty"]
+    result = {
+        "path": path,
+        "gen_model": run["model"],
+        "difficulty": difficulty,
+        "status": "ok",
+        "misses": 0,
+    }
+
+    if mode == "recorded":
+        scores = transcript.of_type("scored")
+    else:
+        word_index = None
+        if run["wordlist"]:
+            word_index = word_index_for(wordlist or DEFAULT_WORDLIST_PATH)
+        # a tracer per puzzle, so a worker's memory does not grow with every replay
+        set_tracer(Tracer())
+        token = current_transcript.set(transcript)
+        try:
+            with open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+                    if mode == "full":
+                        replay_run(run, transcript, word_index)
+                    else:
+                        rescore_run(run, transcript, word_index)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            current_transcript.reset(token)
+        result["misses"] = transcript.misses
+        scores = [event for event in transcript.events if event["type"] == "scored"]
+
+    if scores:
+        result.update(puzzle_scores(scores, difficulty))
+    elif result["status"] == "ok":
+        result["status"] = "unscored"
+    result["replay_s"] = time.perf_counter() - started_at
+    return result
+
+
+def replay_all(paths, mode, workers, wordlist=None, verbose=False):
+    replay = partial(replay_transcript, mode=mode, wordlist=wordlist, verbose=verbose)
+    if workers <= 1:
+        set_replaying(True)
+        return [replay(path) for path in paths]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=set_replaying, initargs=(True,)
+    ) as executor:
+        chunksize = max(1, len(paths) // (workers * 4))
+        return list(executor.map(replay, paths, chunksize=chunksize))
+
+
+def mean(values):
+    return statistics.mean(values) if values else 0.0
+
+
+def summarize(results):
+    """
+    One row of accuracy and difficulty calibration per gen_model and
+    difficulty.
+    """
+    groups = defaultdict(list)
+    for result in results:
+        if "gen_model" in result:
+            groups[(result["gen_model"], result["difficulty"])].append(result)
+
+    rows = []
+    for (gen_model, difficulty), group in sorted(groups.items()):
+        scored = [result for result in group if "first_accuracy" in result]
+        row = {
+            "gen_model": gen_model,
+            "difficulty": difficulty,
+            "puzzles": len(group),
+            "failed": len(group) - len(scored),
+            "first_acc": mean([result["first_accuracy"] for result in scored]),
+            "final_acc": mean([result["final_accuracy"] for result in scored]),
+            "met_rate": mean([result["met"] for result in scored]),
+            "iterations": mean([result["iterations"] for result in scored]),
+            "misses": sum(result["misses"] for result in group),
+        }
+        for band in BANDS:
+            row[band] = mean([result["bands"][band] for result in scored])
+        row["target_first"] = mean([result["in_target_first"] for result in scored])
+        row["target_final"] = mean([result["in_target_final"] for result in scored])
+        rows.append(row)
+    return rows
+
+
+def print_table(rows, columns):
+    print(" | ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        values = [row[column] for column in columns]
+        values = [round(value, 4) if isinstance(value, float) else value for value in values]
+        print(" | ".join(f"{value:>14}" for value in values))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay recorded transcripts offline and tabulate accuracy and difficulty calibration"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Transcript files, or directories searched for *.jsonl.gz transcripts",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["score", "full", "recorded"],
+        default="score",
+        help="Re-run the solvers and scoring on the recorded crosswords, the whole pipeline, "
+        "or only read the recorded scores",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes replaying transcripts at once",
+    )
+    parser.add_argument(
+        "--wordlist",
+        default=None,
+        help=f"Wordlist for runs that used one (defaults to {DEFAULT_WORDLIST_PATH})",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the output of the replayed runs"
+    )
+    parser.add_argument("--output", help="Write the tables and puzzle scores as JSON to this file")
+
+    args = parser.parse_args()
+
+    paths = find_transcripts(args.paths)
+    if not paths:
+        parser.error("no transcripts found")
+
+    started_at = time.perf_counter()
+    results = replay_all(paths, args.mode, args.workers, args.wordlist, args.verbose)
+    wall = time.perf_counter() - started_at
+    rows = summarize(results)
+
+    print(f"REPLAYED {len(results)} transcript(s) in {wall:.2f}s ({args.mode})")
+    for result in results:
+        if result.get("error"):
+            print(f"FAILED {result['path']}: {result['error']}")
+
+    print("\nACCURACY PER GEN_MODEL AND DIFFICULTY:")
+    print_table(
+        rows,
+        [
+            "gen_model",
+            "difficulty",
+            "puzzles",
+            "failed",
+            "first_acc",
+            "final_acc",
+            "met_rate",
+            "iterations",
+            "misses",
+        ],
+    )
+    print("\nDIFFICULTY CALIBRATION (share of words per accuracy band):")
+    print_table(
+        rows,
+        ["gen_model", "difficulty"] + BANDS + ["target_first", "target_final"],
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"tables": rows, "puzzles": results}, f, indent=4)
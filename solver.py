@@ -1,50 +1,111 @@
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from langchain.schema import SystemMessage
 from dotenv import load_dotenv
 import json
+import asyncio
+from functools import lru_cache
 from helper import *
+from encoders import apply_grid_format, encode_grid
+from grid import CharacterConflictException, OutOfBoundsException
+from tokens import count_message_tokens
+from cache import remember_response
+from tracing import record_response, trace_llm_call, trace_validation
+from streaming import astream_response, placement_error
+from wordlist import clue_word_dict, slot_pattern
+from region import clue_regions, grid_summary, region_view
+from structured import GeneratedWord, Guesses, read_response
 
 load_dotenv()
 
-solver_prompt_template = read_prompt_template("prompts/solver_prompt_template.txt")
+# prompt files, read the first time a prompt using them is built
+solver_prompt_file = "prompts/solver_prompt_template.txt"
+batch_solver_prompt_file = "prompts/batch_solver_prompt_template.txt"
+wordlist_candidates_prompt_file = "prompts/wordlist_candidates_prompt_template.txt"
+region_prompt_file = "prompts/region_prompt_template.txt"
+structured_output_prompt_file = "prompts/structured_output_prompt_template.txt"
 
-chat_prompt = ChatPromptTemplate.from_messages(
-    [
-        SystemMessage(content=solver_prompt_template),
-        HumanMessagePromptTemplate.from_template(
-            "clue_metadata=\n{clue_metadata}\n\nchar_positions=\n{char_positions}\n\nwords={words}\n\ngrid_size={grid_size}"
-        ),
-    ]
-)
+# clues with more wordlist candidates than this are sent without a list
+MAX_PROMPT_CANDIDATES = 10
 
+SOLVER_HUMAN_PROMPT = "clue_metadata=\n{clue_metadata}\n\nchar_positions=\n{char_positions}\n\nwords={words}\n\ngrid_size={grid_size}"
 
-def append_new_word(words_dict, new_word):
-    words_dict.get("words").append(new_word)
 
+@lru_cache(maxsize=None)
+def build_solver_prompt(
+    batched,
+    grid_format="dicts",
+    with_candidates=False,
+    with_region=False,
+    structured=False,
+):
+    system_template = apply_grid_format(
+        read_prompt_template(
+            batch_solver_prompt_file if batched else solver_prompt_file
+        ),
+        grid_format,
+    )
+    human_template = SOLVER_HUMAN_PROMPT
+    if with_candidates:
+        system_template += "\n\n" + read_prompt_template(
+            wordlist_candidates_prompt_file
+        )
+    if with_region:
+        system_template += "\n\n" + read_prompt_template(region_prompt_file)
+        human_template += "\n\nregion={region}\n\ngrid_summary={grid_summary}"
+    if structured:
+        system_template += "\n\n" + read_prompt_template(
+            structured_output_prompt_file
+        )
+    return chat_prompt(system_template, human_template)
 
-def remove_last_word(words_dict):
-    words_dict.get("words").pop()
 
+def annotate_candidates(grid, clue_metadata, word_index, max_candidates):
+    """
+    Copies the clues, adding the wordlist words that fit each clue's cells
+    to the clues with at most max_candidates of them.
+    """
+    annotated = []
+    for clue in clue_metadata:
+        candidates = word_index.candidates(
+            clue["length"], slot_pattern(grid, clue), limit=max_candidates + 1
+        )
+        if 0 < len(candidates) <= max_candidates:
+            clue = dict(clue, candidates=candidates)
+        annotated.append(clue)
+    return annotated
 
-def solve_puzzle_clue(llm, grid_size, clue_metadata, solved_state, verbose):
-    # get character positions
-    char_positions, words = get_character_positions_and_words(solved_state, grid_size)
 
+def solver_messages(
+    grid,
+    clue_metadata,
+    verbose,
+    batched=False,
+    grid_format="dicts",
+    word_index=None,
+    max_candidates=MAX_PROMPT_CANDIDATES,
+    region=None,
+    structured=False,
+):
+    if word_index is not None:
+        clue_metadata = annotate_candidates(grid, clue_metadata, word_index, max_candidates)
+    prompt = build_solver_prompt(
+        batched, grid_format, word_index is not None, region is not None, structured
+    )
+    view = region_view(grid, region) if region else grid
+    messages = prompt.format_messages(
+        clue_metadata=clue_metadata,
+        char_positions=encode_grid(view, grid_format),
+        words=view.words,
+        grid_size=grid.grid_size,
+        region=region.describe() if region else None,
+        grid_summary=grid_summary(grid, view) if region else None,
+    )
+    vprint(verbose, f"PROMPT TOKENS: {count_message_tokens(messages)}")
+    return messages
+
+
+def apply_solver_response(
+    llm, response, grid, clue_metadata, verbose, event, structured=False
+):
     guessed = False
-    new_word_dict = {}
-
-    try:
-        response = llm.invoke(
-            input=chat_prompt.format_messages(
-                clue_metadata=clue_metadata,
-                char_positions=char_positions,
-                words=words,
-                grid_size=grid_size,
-            )
-        )
-    except Exception as e:
-        vprint(verbose, str(e))
-        return guessed, clue_metadata, solved_state, new_word_dict
 
     vprint(verbose, "Attempting to guess a new clue")
     vprint(verbose, response.content)
@@ -52,23 +113,29 @@ def solve_puzzle_clue(llm, grid_size, clue_metadata, solved_state, verbose):
 
     # extract new word from response1
     vprint(verbose, "Extracting guessed word from response")
-    new_word_dict = extract_json_from_text(response.content)
+    new_word_dict = read_response(
+        event,
+        response.content,
+        GeneratedWord if structured else None,
+        extract_json_from_text,
+    )
+    event["parse_outcome"] = parse_outcome(new_word_dict)
     vprint(verbose, new_word_dict)
     vprint(verbose, "*" * 50)
 
-    if isinstance(new_word_dict, dict) and not new_word_dict.get("message"):
-        append_new_word(solved_state, new_word_dict)
+    if event["parse_outcome"] == "ok":
         try:
-            char_positions, words = get_character_positions_and_words(
-                solved_state, grid_size
-            )
+            grid.place(new_word_dict)
             guessed = True
+            trace_validation(llm, "solve", new_word_dict, "accepted")
         except (CharacterConflictException, OutOfBoundsException) as e:
+            trace_validation(llm, "solve", new_word_dict, "rejected", rejection_reason(e))
+            event["retry_reason"] = "invalid_placement"
             vprint(verbose, str(e))
             vprint(verbose, "*" * 50)
-            remove_last_word(solved_state)
-        else:
-            vprint(verbose, "Retrying...")
+    else:
+        event["retry_reason"] = event["parse_outcome"]
+        vprint(verbose, "Retrying...")
 
     new_clue_metadata = clue_metadata
     if guessed:
@@ -76,59 +143,198 @@ def solve_puzzle_clue(llm, grid_size, clue_metadata, solved_state, verbose):
             clue for clue in clue_metadata if clue["clue"] != new_word_dict["clue"]
         ]
 
-    return guessed, new_clue_metadata, solved_state, new_word_dict
+    return guessed, new_clue_metadata, new_word_dict
 
 
-def solve(llm, model, grid_size, puzzle, verbose):
-    if grid_size < 10:
-        vprint(verbose, "grid_size must be at least 10.")
-        return
+def guess_error(grid, clue_metadata, word_d):
+    """
+    Returns why a streamed guess cannot be accepted, or None if it fits one
+    of the remaining clues and the grid.
+    """
+    slot = (word_d["row"], word_d["column"], word_d["isAcross"])
+    if not any(
+        (clue["row"], clue["column"], clue["across"]) == slot
+        and clue["length"] == len(word_d["word"])
+        for clue in clue_metadata
+    ):
+        return "no_matching_clue"
+    return placement_error(grid, word_d, allow_duplicates=True)
+
+
+async def asolve_puzzle_clue(
+    llm,
+    grid,
+    clue_metadata,
+    verbose,
+    grid_format="dicts",
+    stream=False,
+    word_index=None,
+    max_candidates=MAX_PROMPT_CANDIDATES,
+    structured=False,
+):
+    messages = solver_messages(
+        grid,
+        clue_metadata,
+        verbose,
+        False,
+        grid_format,
+        word_index,
+        max_candidates,
+        structured=structured,
+    )
+    with trace_llm_call(llm, "solve", messages) as event:
+        aborted = None
+        try:
+            if structured:
+                response = await llm.ainvoke(input=messages, schema=GeneratedWord)
+            elif stream:
+                response, aborted = await astream_response(
+                    llm,
+                    messages,
+                    ["word", "message"],
+                    check=lambda word_d: guess_error(grid, clue_metadata, word_d),
+                )
+            else:
+                response = await llm.ainvoke(input=messages)
+        except Exception as e:
+            vprint(verbose, str(e))
+            event["error"] = f"{type(e).__name__}: {e}"
+            event["parse_outcome"] = "error"
+            return False, clue_metadata, {}
+
+        record_response(event, response)
+        if aborted:
+            vprint(verbose, f"ABORTED response early: {aborted}")
+            event["parse_outcome"] = "aborted"
+            event["retry_reason"] = aborted
+            return False, clue_metadata, {}
+        guessed, remaining, word_d = apply_solver_response(
+            llm, response, grid, clue_metadata, verbose, event, structured
+        )
+        if guessed:
+            remember_response(llm, messages, response, GeneratedWord if structured else None)
+        return guessed, remaining, word_d
 
-    with open(puzzle, "r") as f:
-        puzzle = json.load(f)
 
+def apply_batch_response(
+    llm, response, grid, clue_metadata, verbose, event, structured=False
+):
+    vprint(verbose, "Attempting to guess a batch of clues")
+    vprint(verbose, response.content)
     vprint(verbose, "*" * 50)
-    vprint(verbose, f"SOLVING puzzle using: {model}")
 
-    unsolved_count = len(puzzle["words"])
-    clue_metadata, solution = return_clue_metadata(puzzle)
-    guessed = True
-    api_retry_count = 3
-    solved_state = {"words": []}
-    while unsolved_count and api_retry_count > 0:
-        guessed, clue_metadata, solved_state, solved_word = solve_puzzle_clue(
-            llm, grid_size, clue_metadata, solved_state, verbose
+    data = read_response(
+        event,
+        response.content,
+        Guesses if structured else None,
+        extract_json_object,
+    )
+    if not isinstance(data, dict) or not isinstance(data.get("guesses"), list):
+        vprint(verbose, f"Could not read guesses from response: {data}")
+        event["parse_outcome"] = event["retry_reason"] = "invalid_json"
+        return [], clue_metadata
+    event["parse_outcome"] = "ok"
+
+    open_slots = {
+        (clue["row"], clue["column"], clue["across"]): clue for clue in clue_metadata
+    }
+    guessed_words = []
+    for guess in data["guesses"]:
+        try:
+            slot = (int(guess["row"]), int(guess["column"]), bool(guess["isAcross"]))
+            word = str(guess["word"]).lower()
+        except (KeyError, TypeError, ValueError):
+            vprint(verbose, f"DROPPED malformed guess {guess}")
+            trace_validation(llm, "solve", {}, "rejected", "missing_field")
+            continue
+
+        clue = open_slots.get(slot)
+        if clue is None or len(word) != clue["length"]:
+            vprint(verbose, f"DROPPED guess {guess} that does not fit a remaining clue")
+            trace_validation(llm, "solve", guess, "rejected", "no_matching_clue")
+            continue
+
+        new_word_dict = {
+            "word": word,
+            "row": slot[0],
+            "column": slot[1],
+            "isAcross": slot[2],
+            "clue": clue["clue"],
+        }
+        try:
+            grid.place(new_word_dict)
+        except (CharacterConflictException, OutOfBoundsException) as e:
+            vprint(verbose, f"DROPPED guess {word}: {e}")
+            trace_validation(llm, "solve", new_word_dict, "rejected", rejection_reason(e))
+            continue
+        trace_validation(llm, "solve", new_word_dict, "accepted")
+
+        del open_slots[slot]
+        guessed_words.append(new_word_dict)
+
+    remaining = [
+        clue
+        for clue in clue_metadata
+        if (clue["row"], clue["column"], clue["across"]) in open_slots
+    ]
+    return guessed_words, remaining
+
+
+async def asolve_puzzle_clues(
+    llm,
+    grid,
+    clue_metadata,
+    verbose,
+    grid_format="dicts",
+    stream=False,
+    word_index=None,
+    max_candidates=MAX_PROMPT_CANDIDATES,
+    region=None,
+    structured=False,
+):
+    messages = solver_messages(
+        grid,
+        clue_metadata,
+        verbose,
+        True,
+        grid_format,
+        word_index,
+        max_candidates,
+        region,
+        structured,
+    )
+    with trace_llm_call(llm, "solve", messages) as event:
+        try:
+            if structured:
+                response = await llm.ainvoke(input=messages, schema=Guesses)
+            elif stream:
+                response, _ = await astream_response(llm, messages, ["guesses"])
+            else:
+                response = await llm.ainvoke(input=messages)
+        except Exception as e:
+            vprint(verbose, str(e))
+            event["error"] = f"{type(e).__name__}: {e}"
+            event["parse_outcome"] = "error"
+            return [], clue_metadata
+
+        record_response(event, response)
+        guessed_words, remaining = apply_batch_response(
+            llm, response, grid, clue_metadata, verbose, event, structured
         )
+        if guessed_words:
+            remember_response(llm, messages, response, Guesses if structured else None)
+        elif "retry_reason" not in event:
+            event["retry_reason"] = "invalid_placement"
+        return guessed_words, remaining
 
-        if guessed:
-            unsolved_count -= 1
-            api_retry_count = 3
-            vprint(verbose, f"SUCCESS: new word guessed is {solved_word}")
-            vprint(verbose, f"Remaining unsolved count: {unsolved_count}")
-            vprint(verbose, "*" * 50)
-        else:
-            vprint(verbose, "FAILED: calling API to guess word again")
-            vprint(verbose, "*" * 50)
-            api_retry_count -= 1
 
+def build_solver_response(grid, solution, model, verbose):
+    solved_state = grid.to_json()
     vprint(verbose, json.dumps(solved_state, indent=4))
     vprint(verbose, f"Final Solved Word Count: {len(solved_state['words'])}")
 
-    grid_data, _ = get_character_positions_and_words(solved_state, grid_size)
-    positions = {}
-    for d in grid_data:
-        positions[f"{d['row']},{d['column']}"] = d["character"]
-
     vprint(verbose, "\nCROSSWORD -")
-    c_s = ""
-    for i in range(grid_size):
-        for j in range(grid_size):
-            if f"{i},{j}" in positions:
-                c_s += positions[f"{i},{j}"] + " "
-            else:
-                c_s += "_ "
-        c_s += "\n"
-    vprint(verbose, c_s)
+    vprint(verbose, grid.render() + "\n")
 
     response = {"solved": [], "unsolved": []}
 
@@ -146,12 +352,252 @@ def solve(llm, model, grid_size, puzzle, verbose):
             seen[word_d["word"]] = True
             correct_count += 1
             response["solved"].append(word_d["word"])
-    vprint(
-        verbose, f"\n{model} Solve Percentage - {correct_count}/{len(puzzle['words'])}"
-    )
+    vprint(verbose, f"\n{model} Solve Percentage - {correct_count}/{len(solution)}")
 
     for word in solution.keys():
         if solution[word] not in response["solved"]:
             response["unsolved"].append(solution[word])
 
     return response
+
+
+def solve(llm, model, grid_size, puzzle, verbose, **solve_kwargs):
+    """
+    Synchronous asolve; puzzle is the crossword dict or a path to its JSON.
+    """
+    if isinstance(puzzle, str):
+        with open(puzzle, "r") as f:
+            puzzle = json.load(f)
+
+    return asyncio.run(asolve(llm, model, grid_size, puzzle, verbose, **solve_kwargs))
+
+
+def clue_key(clue):
+    return (clue["row"], clue["column"], clue["across"], clue["clue"])
+
+
+def apply_memo(grid, clue_metadata, memo, verbose):
+    """
+    Places the remembered guesses for clues answered in an earlier
+    iteration and returns the clues that still have to be asked.
+    """
+    remaining = []
+    for clue in clue_metadata:
+        key = clue_key(clue)
+        if key not in memo:
+            remaining.append(clue)
+            continue
+        if memo[key] is None:
+            continue
+        try:
+            grid.place(clue_word_dict(clue, memo[key]))
+        except (CharacterConflictException, OutOfBoundsException):
+            remaining.append(clue)
+    vprint(
+        verbose,
+        f"REUSED {len(clue_metadata) - len(remaining)} remembered clue result(s)",
+    )
+    return remaining
+
+
+def update_memo(grid, clue_metadata, memo):
+    guesses = {
+        (int(word_d["row"]), int(word_d["column"]), word_d["isAcross"]): word_d["word"]
+        for word_d in grid.entries
+    }
+    for clue in clue_metadata:
+        memo[clue_key(clue)] = guesses.get((clue["row"], clue["column"], clue["across"]))
+
+
+def fill_forced(grid, clue_metadata, word_index, verbose):
+    """
+    Places the clues whose cells only one wordlist word fits, repeating as
+    each placement can force its crossing clues, and returns the clues that
+    are still open.
+    """
+    remaining = list(clue_metadata)
+    placed = True
+    while placed:
+        placed = False
+        for clue in list(remaining):
+            candidates = word_index.candidates(
+                clue["length"], slot_pattern(grid, clue), limit=2
+            )
+            if len(candidates) != 1:
+                continue
+            try:
+                grid.place(clue_word_dict(clue, candidates[0]))
+            except (CharacterConflictException, OutOfBoundsException):
+                continue
+            vprint(verbose, f"FORCED by the wordlist: {candidates[0]}")
+            remaining.remove(clue)
+            placed = True
+    return remaining
+
+
+def fill_from_wordlist(grid, clue_metadata, word_index, verbose):
+    """
+    LLM-free baseline: repeatedly fills the clue with the fewest fitting
+    wordlist words with the first of them that is not in the grid yet.
+    """
+    remaining = list(clue_metadata)
+    while remaining:
+        counts = [
+            (word_index.count(clue["length"], slot_pattern(grid, clue)), i)
+            for i, clue in enumerate(remaining)
+        ]
+        counts = [entry for entry in counts if entry[0]]
+        if not counts:
+            break
+        clue = remaining.pop(min(counts)[1])
+        for word in word_index.candidates(clue["length"], slot_pattern(grid, clue)):
+            if word in grid.words:
+                continue
+            try:
+                grid.place(clue_word_dict(clue, word))
+            except (CharacterConflictException, OutOfBoundsException):
+                break
+            vprint(verbose, f"FILLED from the wordlist: {word}")
+            break
+
+
+async def asolve(
+    llm,
+    model,
+    grid_size,
+    puzzle,
+    verbose,
+    batch_size=1,
+    grid_format="dicts",
+    stream=False,
+    memo=None,
+    word_index=None,
+    max_candidates=MAX_PROMPT_CANDIDATES,
+    on_guess=None,
+    region_size=None,
+    structured=False,
+):
+    """
+    Solves the in-memory puzzle one clue per LLM call, or batch_size clues
+    per call when batch_size > 1 (0 asks for all remaining clues at once).
+
+    With a word_index, clues that only one wordlist word fits are filled
+    without a call and the other clues are sent with their short candidate
+    lists. Passing llm=None solves from the wordlist alone.
+
+    memo maps (row, column, across, clue) to this solver's guess, or None
+    when it missed it, and is updated after solving. Clues found in it are
+    not asked again, so only new or rewritten clues cost LLM calls.
+
+    on_guess(clue_key, word) is called for every clue the LLM answers, as
+    soon as its answer is placed.
+
+    On grids larger than region_size, the clues are grouped by region (see
+    region.clue_regions) and every group is asked in its own call, with
+    only its region of the grid, all groups at the same time.
+
+    With structured, every call asks for a tool call following the
+    structured.py schemas, read as text when the model does not make one.
+    """
+    if grid_size < 10:
+        vprint(verbose, "grid_size must be at least 10.")
+        return
+
+    vprint(verbose, "*" * 50)
+    vprint(verbose, f"SOLVING puzzle using: {model}")
+
+    clue_metadata, solution = return_clue_metadata(puzzle)
+    all_clues = clue_metadata
+    grid = Grid(grid_size)
+    if memo is not None:
+        clue_metadata = apply_memo(grid, clue_metadata, memo, verbose)
+    if word_index is not None:
+        clue_metadata = fill_forced(grid, clue_metadata, word_index, verbose)
+    if llm is None:
+        fill_from_wordlist(grid, clue_metadata, word_index, verbose)
+        clue_metadata = []
+
+    clues = {(clue["row"], clue["column"], clue["across"]): clue for clue in all_clues}
+    placed = len(grid.entries)
+
+    unsolved_count = len(clue_metadata)
+    guessed = True
+    api_retry_count = 3
+    while unsolved_count and clue_metadata and api_retry_count > 0:
+        if region_size and grid_size > region_size:
+            results = await asyncio.gather(
+                *[
+                    asolve_puzzle_clues(
+                        llm,
+                        grid,
+                        clues,
+                        verbose,
+                        grid_format,
+                        stream,
+                        word_index,
+                        max_candidates,
+                        region,
+                        structured,
+                    )
+                    for region, clues in clue_regions(
+                        grid, clue_metadata, region_size
+                    )
+                ]
+            )
+            solved_words = [word for solved, _ in results for word in solved]
+            clue_metadata = [clue for _, leftovers in results for clue in leftovers]
+            guessed = bool(solved_words)
+        elif batch_size == 1:
+            guessed, clue_metadata, solved_word = await asolve_puzzle_clue(
+                llm,
+                grid,
+                clue_metadata,
+                verbose,
+                grid_format,
+                stream,
+                word_index,
+                max_candidates,
+                structured,
+            )
+            solved_words = [solved_word] if guessed else []
+        else:
+            batch = clue_metadata[: batch_size or len(clue_metadata)]
+            solved_words, leftovers = await asolve_puzzle_clues(
+                llm,
+                grid,
+                batch,
+                verbose,
+                grid_format,
+                stream,
+                word_index,
+                max_candidates,
+                structured=structured,
+            )
+            # re-ask the leftovers after the clues that were not in this batch
+            clue_metadata = clue_metadata[len(batch) :] + leftovers
+            guessed = bool(solved_words)
+
+        if on_guess:
+            for word_d in grid.entries[placed:]:
+                clue = clues.get(
+                    (int(word_d["row"]), int(word_d["column"]), word_d["isAcross"])
+                )
+                if clue:
+                    on_guess(clue_key(clue), word_d["word"])
+            placed = len(grid.entries)
+
+        if guessed:
+            unsolved_count -= len(solved_words)
+            api_retry_count = 3
+            for solved_word in solved_words:
+                vprint(verbose, f"SUCCESS: new word guessed is {solved_word}")
+            vprint(verbose, f"Remaining unsolved count: {unsolved_count}")
+            vprint(verbose, "*" * 50)
+        else:
+            vprint(verbose, "FAILED: calling API to guess word again")
+            vprint(verbose, "*" * 50)
+            api_retry_count -= 1
+
+    if memo is not None:
+        update_memo(grid, all_clues, memo)
+    return build_solver_response(grid, solution, model, verbose)
@@ -0,0 +1,62 @@
+import asyncio
+import contextvars
+import json
+import threading
+from helper import get_llm
+
+
+class SolverService:
+    """
+    Event loop running in a background thread for the lifetime of the
+    process, on which the solvers of every iteration and every puzzle run.
+    It keeps one client per solver config, so the clients' HTTP connection
+    pools stay bound to a single loop and are reused from run to run.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="solver-service", daemon=True
+        )
+        self._thread.start()
+
+    def client(self, config):
+        key = json.dumps(config, sort_keys=True, default=str)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = get_llm(config)
+            return self._clients[key]
+
+    def run(self, coroutine_function, *args, **kwargs):
+        """
+        Runs coroutine_function(*args, **kwargs) on the service loop and
+        waits for its result. Context variables of the calling thread, such
+        as the current batch job, are carried over.
+        """
+        context = contextvars.copy_context()
+
+        async def in_context():
+            for var, value in context.items():
+                var.set(value)
+            return await coroutine_function(*args, **kwargs)
+
+        return asyncio.run_coroutine_threadsafe(in_context(), self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_solver_service():
+    global _service
+    with _service_lock:
+        if _service is None or _service.loop.is_closed():
+            _service = SolverService()
+        return _service
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# a solver worker: imports the solver, builds its client and prompt and
+# solves a two word puzzle with a fake model
+WORKER_CODE = """
+from helper import get_llm
+from solver import solve
+puzzle = {"words": [
+    {"word": "apple", "row": 0, "column": 0, "isAcross": True, "clue": "A fruit."},
+    {"word": "arrow", "row": 0, "column": 0, "isAcross": False, "clue": "A pointer."},
+]}
+solve(get_llm({"model": "fake-solver"}), "fake-solver", 10, puzzle, False)
+"""
+
+# name -> command, run with the repository as working directory
+CASES = {
+    "generator_help": ["generator.py", "--help"],
+    "batch_help": ["batch.py", "--help"],
+    "solver_import": ["-c", "import solver"],
+    "solver_worker": ["-c", WORKER_CODE],
+    "fake_run": [
+        "generator.py",
+        "--gen_model",
+        "fake",
+        "--fake_solvers",
+        "--grid_size",
+        "10",
+        "--word_count",
+        "3",
+        "--no_rate_limits",
+    ],
+}
+
+
+def time_case(command, output_dir):
+    if command[0] == "generator.py" and "--help" not in command:
+        command = command + ["--output_dir", output_dir]
+    started_at = time.perf_counter()
+    subprocess.run(
+        [sys.executable] + command,
+        cwd=REPO_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - started_at
+
+
+def slowest_imports(module, count):
+    """
+    The modules with the largest cumulative import time when importing
+    module in a fresh interpreter, from python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)", line)
+        if match:
+            imports.append((int(match.group(1)) / 1e6, match.group(2)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def print_table(results):
+    print(" | ".join(f"{column:>14}" for column in ["case", "min_s", "mean_s"]))
+    for case, metrics in results.items():
+        values = [case, round(metrics["min_s"], 4), round(metrics["mean_s"], 4)]
+        print(" | ".join(f"{value:>14}" for value in values))
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for case, metrics in results.items():
+        before = baseline.get(case)
+        if before and metrics["min_s"] > before["min_s"] * (1 + tolerance):
+            regressions.append(
+                f"{case} min_s: {before['min_s']:.4f} -> {metrics['min_s']:.4f}"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of the CLIs and of solver worker processes"
+    )
+    parser.add_argument(
+        "--cases", nargs="+", choices=list(CASES), default=list(CASES)
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Fresh processes timed per case"
+    )
+    parser.add_argument(
+        "--imports",
+        type=int,
+        default=0,
+        help="Also list this many of the slowest imports of generator.py",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Fail if results regress against this results file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown against the baseline",
+    )
+
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for case in args.cases:
+            times = [time_case(CASES[case], output_dir) for _ in range(args.repeats)]
+            results[case] = {"min_s": min(times), "mean_s": statistics.mean(times)}
+
+    print_table(results)
+
+    if args.imports:
+        print("\nSLOWEST IMPORTS (cumulative seconds):")
+        for seconds, module in slowest_imports("generator", args.imports):
+            print(f"{seconds:.4f} {module}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,162 @@
+import json
+import re
+from helper import rejection_reason
+from grid import CharacterConflictException, OutOfBoundsException
+
+# fields of a placement that are final once the text after them is read
+PARTIAL_FIELD_PATTERNS = {
+    "word": r'"word"\s*:\s*"([^"]+)"',
+    "row": r'"row"\s*:\s*"?(\d+)"?\s*[,}\n]',
+    "column": r'"column"\s*:\s*"?(\d+)"?\s*[,}\n]',
+    "isAcross": r'"isAcross"\s*:\s*(true|false)\b',
+}
+
+
+class JSONObjectScanner:
+    """
+    Tracks the top-level JSON objects of a completion that arrives in
+    chunks, so the caller can act on an object as soon as it closes.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.checked = False
+
+    def feed(self, chunk):
+        """
+        Appends a chunk and returns the top-level objects it closed, parsed
+        into dicts; objects that are not valid JSON are skipped.
+        """
+        closed = []
+        offset = len(self.text)
+        self.text += chunk
+        for i, char in enumerate(chunk, offset):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == "{":
+                if not self.depth:
+                    self.start = i
+                    self.checked = False
+                self.depth += 1
+            elif char == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    try:
+                        closed.append(json.loads(self.text[self.start : i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self.start = None
+        return closed
+
+    def partial(self):
+        return self.text[self.start :] if self.start is not None else ""
+
+
+def partial_placement(text):
+    """
+    Reads word, row, column and isAcross from a JSON object that is still
+    being streamed, or returns None until all four are complete.
+    """
+    fields = {}
+    for field, pattern in PARTIAL_FIELD_PATTERNS.items():
+        match = re.search(pattern, text)
+        if not match:
+            return None
+        fields[field] = match.group(1)
+    return {
+        "word": fields["word"].lower(),
+        "row": int(fields["row"]),
+        "column": int(fields["column"]),
+        "isAcross": fields["isAcross"] == "true",
+    }
+
+
+def placement_error(grid, word_d, allow_duplicates=False):
+    """
+    Returns why the word cannot be placed in the grid, or None if it fits.
+    """
+    if not allow_duplicates and word_d["word"] in grid.words:
+        return "duplicate"
+    try:
+        grid.check(word_d)
+    except (CharacterConflictException, OutOfBoundsException) as e:
+        return rejection_reason(e)
+    return None
+
+
+def _advance(scanner, chunk, stop_keys, check):
+    """
+    Feeds a chunk to the scanner and returns (done, abort_reason).
+    """
+    for data in scanner.feed(chunk):
+        if isinstance(data, dict) and any(key in data for key in stop_keys):
+            return True, None
+
+    if check and not scanner.checked:
+        placement = partial_placement(scanner.partial())
+        if placement is not None:
+            scanner.checked = True
+            reason = check(placement)
+            if reason:
+                return True, reason
+    return False, None
+
+
+def _streamed_response(scanner, metadata, aborted):
+    from langchain_core.messages import AIMessage
+
+    response = AIMessage(content=scanner.text, response_metadata=dict(metadata))
+    if aborted:
+        response.response_metadata["aborted"] = aborted
+    return response
+
+
+def stream_response(llm, messages, stop_keys, check=None):
+    """
+    Streams a completion and stops reading once the first JSON object
+    containing one of stop_keys has closed.
+
+    check(placement) is called as soon as the word and its start cell can be
+    read from the object being streamed, and returning a reason abandons the
+    request. Returns (response with the text read so far, abort reason).
+    """
+    scanner = JSONObjectScanner()
+    metadata = {}
+    done, aborted = False, None
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            metadata.update(chunk.response_metadata or {})
+            done, aborted = _advance(scanner, chunk.content, stop_keys, check)
+            if done:
+                break
+    finally:
+        stream.close()
+    return _streamed_response(scanner, metadata, aborted), aborted
+
+
+async def astream_response(llm, messages, stop_keys, check=None):
+    scanner = JSONObjectScanner()
+    metadata = {}
+    done, aborted = False, None
+    stream = llm.astream(messages)
+    try:
+        async for chunk in stream:
+            metadata.update(chunk.response_metadata or {})
+            done, aborted = _advance(scanner, chunk.content, stop_keys, check)
+            if done:
+                break
+    finally:
+        await stream.aclose()
+    return _streamed_response(scanner, metadata, aborted), aborted
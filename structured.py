@@ -0,0 +1,174 @@
+import json
+from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+PLACEMENT_FIELDS = ["word", "row", "column", "isAcross", "clue", "positions"]
+
+
+class WordPlacement(BaseModel):
+    """A word placed in the crossword grid."""
+
+    word: str = Field(description="The word, lowercase")
+    row: int = Field(description="Row of the first character")
+    column: int = Field(description="Column of the first character")
+    isAcross: bool = Field(description="True for across, false for down")
+    clue: str = Field(description="The clue for the word")
+    positions: str = Field(
+        description="Comma separated (character, row, column) tuples of the word"
+    )
+
+
+class GeneratedWord(BaseModel):
+    """The new word for the crossword, or a message when none can be added."""
+
+    word: Optional[str] = Field(None, description="The word, lowercase")
+    row: Optional[int] = Field(None, description="Row of the first character")
+    column: Optional[int] = Field(None, description="Column of the first character")
+    isAcross: Optional[bool] = Field(
+        None, description="True for across, false for down"
+    )
+    clue: Optional[str] = Field(None, description="The clue for the word")
+    positions: Optional[str] = Field(
+        None,
+        description="Comma separated (character, row, column) tuples of the word",
+    )
+    message: Optional[str] = Field(
+        None, description="Only set when no word can be given"
+    )
+
+    @model_validator(mode="after")
+    def placement_or_message(self):
+        missing = [field for field in PLACEMENT_FIELDS if getattr(self, field) is None]
+        if missing and not self.message:
+            raise ValueError(f"missing fields {missing} without a message")
+        return self
+
+
+class Candidates(BaseModel):
+    """Ranked candidate words for the crossword, most preferred first."""
+
+    candidates: List[WordPlacement]
+
+
+class Guess(BaseModel):
+    """A guessed answer to one of the clues."""
+
+    word: str = Field(description="The guessed word, lowercase")
+    row: int
+    column: int
+    isAcross: bool
+    clue: str = Field(description="The clue that was answered")
+
+
+class Guesses(BaseModel):
+    """Guessed answers, one per guessed clue."""
+
+    guesses: List[Guess]
+
+
+class UpdatedClue(BaseModel):
+    word: str
+    updatedClue: str
+
+
+class UpdatedClues(BaseModel):
+    """The rewritten clues, one per word."""
+
+    words: List[UpdatedClue]
+
+
+def tool_kwargs(provider, schema):
+    """
+    Chat model call arguments that make the model answer by calling a tool
+    whose arguments follow the schema.
+    """
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    tool = convert_to_openai_tool(schema)
+    name = tool["function"]["name"]
+    if provider == "anthropic":
+        return {
+            "tools": [
+                {
+                    "name": name,
+                    "description": tool["function"]["description"],
+                    "input_schema": tool["function"]["parameters"],
+                }
+            ],
+            "tool_choice": {"type": "tool", "name": name},
+        }
+    return {
+        "tools": [tool],
+        "tool_choice": {"type": "function", "function": {"name": name}},
+    }
+
+
+def structured_message(response):
+    """
+    Moves the arguments of the response's tool call into its content as
+    JSON, so it can be cached, traced and read like a text response. A
+    response without a tool call is returned unchanged.
+    """
+    tool_calls = getattr(response, "tool_calls", None)
+    if not tool_calls:
+        return response
+    from langchain_core.messages import AIMessage
+
+    return AIMessage(
+        content=json.dumps(tool_calls[0]["args"]),
+        response_metadata=dict(response.response_metadata, structured=True),
+        usage_metadata=response.usage_metadata,
+    )
+
+
+class StructuredOutputLLM:
+    """
+    Wraps a chat model so that invoke(..., schema=Model) asks for a tool call
+    following the pydantic schema and returns its arguments as the content.
+    Calls without a schema, and streams, are passed through.
+    """
+
+    def __init__(self, llm, provider):
+        self.llm = llm
+        self.provider = provider
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def invoke(self, input, *args, schema=None, **kwargs):
+        if schema is None:
+            return self.llm.invoke(input, *args, **kwargs)
+        kwargs.update(tool_kwargs(self.provider, schema))
+        return structured_message(self.llm.invoke(input, *args, **kwargs))
+
+    async def ainvoke(self, input, *args, schema=None, **kwargs):
+        if schema is None:
+            return await self.llm.ainvoke(input, *args, **kwargs)
+        kwargs.update(tool_kwargs(self.provider, schema))
+        return structured_message(await self.llm.ainvoke(input, *args, **kwargs))
+
+
+def parse_structured(text, schema):
+    """
+    The JSON text validated against the schema as a dict, or None when it
+    does not match.
+    """
+    try:
+        return schema.model_validate_json(text).model_dump(exclude_none=True)
+    except ValidationError:
+        return None
+
+
+def read_response(event, text, schema, scrape):
+    """
+    Reads a response: validated against the schema when one is given, and
+    otherwise, or when it does not match (e.g. the model answered in text
+    instead of calling the tool), with scrape(text).
+    """
+    if schema is not None:
+        data = parse_structured(text, schema)
+        if data is not None:
+            event["structured"] = True
+            return data
+        event["parse_fallback"] = True
+    return scrape(text)
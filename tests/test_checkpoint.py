@@ -0,0 +1,22 @@
+from checkpoint import Checkpoint
+
+
+def word(name, row):
+    return {"word": name, "row": row, "column": 0, "isAcross": True}
+
+
+def test_resume_restores_the_backtracked_search(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    checkpoint.word(word("apple", 0), calls=1)
+    checkpoint.word(word("beach", 2), calls=2)
+    checkpoint.undo(("beach", 2, 0, True), calls=5, depth=1)
+    checkpoint.close()
+
+    resumed = Checkpoint(tmp_path, resume=True)
+    words, best, avoid, calls, depth = resumed.placed_words()
+    resumed.close()
+
+    assert [word_d["word"] for word_d in words] == ["apple"]
+    assert [word_d["word"] for word_d in best] == ["apple", "beach"]
+    assert avoid == {("beach", 2, 0, True)}
+    assert (calls, depth) == (5, 1)
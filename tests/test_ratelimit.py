@@ -0,0 +1,56 @@
+import asyncio
+from langchain_core.messages import AIMessage, AIMessageChunk
+from ratelimit import RateLimitedLLM, RateLimiter
+
+
+class SlowLLM:
+    """
+    Answers after `latency` seconds, so calls can be cancelled in flight.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def ainvoke(self, input, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="ok")
+
+    async def astream(self, input, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        yield AIMessageChunk(content="ok")
+
+
+async def cancel_in_flight(call):
+    task = asyncio.ensure_future(call())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def first_chunk(llm):
+    async for chunk in llm.astream("hi"):
+        return chunk
+
+
+def test_cancelled_ainvoke_gives_back_its_slot():
+    async def run():
+        limiter = RateLimiter("fake", max_in_flight=2, max_attempts=1)
+        slow = RateLimitedLLM(SlowLLM(10), limiter)
+        for _ in range(3):
+            await cancel_in_flight(lambda: slow.ainvoke("hi"))
+        fast = RateLimitedLLM(SlowLLM(0), limiter)
+        return await asyncio.wait_for(fast.ainvoke("hi"), 1)
+
+    assert asyncio.run(run()).content == "ok"
+
+
+def test_cancelled_astream_gives_back_its_slot():
+    async def run():
+        limiter = RateLimiter("fake", max_in_flight=2, max_attempts=1)
+        slow = RateLimitedLLM(SlowLLM(10), limiter)
+        for _ in range(3):
+            await cancel_in_flight(lambda: first_chunk(slow))
+        fast = RateLimitedLLM(SlowLLM(0), limiter)
+        return await asyncio.wait_for(first_chunk(fast), 1)
+
+    assert asyncio.run(run()).content == "ok"
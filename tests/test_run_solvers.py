@@ -0,0 +1,58 @@
+import asyncio
+import generator
+from configs.fake import fake_solver_configs
+
+
+def patch_asolve(monkeypatch, finished, failing=None, latency=None):
+    """
+    Replaces the solver with one that answers after latency[model] seconds
+    and raises for the failing model.
+    """
+    latency = latency or {}
+
+    async def asolve(solver, model, *args, **kwargs):
+        await asyncio.sleep(latency.get(model, 0))
+        if model == failing:
+            raise RuntimeError("provider error")
+        finished.append(model)
+        return {"guesses": []}
+
+    monkeypatch.setattr(generator, "asolve", asolve)
+
+
+def run(coroutine):
+    return generator.get_solver_service().run(lambda: coroutine)
+
+
+def test_failing_solver_leaves_the_others_to_answer(monkeypatch):
+    finished = []
+    failing = fake_solver_configs[0]["model"]
+    patch_asolve(monkeypatch, finished, failing=failing)
+
+    responses = run(
+        generator.run_solvers({}, 10, False, configs=fake_solver_configs)
+    )
+
+    models = [config["model"] for config in fake_solver_configs[1:]]
+    assert sorted(response["model"] for response in responses) == sorted(models)
+
+
+def test_solvers_are_cancelled_when_the_iteration_is_abandoned(monkeypatch):
+    finished = []
+    fast, *slow = [config["model"] for config in fake_solver_configs]
+    patch_asolve(monkeypatch, finished, latency={model: 0.5 for model in slow})
+
+    def stop_when(responses, pending):
+        raise RuntimeError("abandoned")
+
+    try:
+        run(
+            generator.run_solvers(
+                {}, 10, False, configs=fake_solver_configs, stop_when=stop_when
+            )
+        )
+    except RuntimeError:
+        pass
+    run(asyncio.sleep(1))
+
+    assert finished == [fast]
@@ -0,0 +1,24 @@
+_token_encoding = None
+
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken's cl100k_base encoding when it is available,
+    otherwise estimates them at four characters per token.
+    """
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            import tiktoken
+
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(messages):
+    # every chat message carries a few tokens of role and separator overhead
+    return sum(count_tokens(message.content) + 4 for message in messages)
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from tokens import count_message_tokens, count_tokens
+
+
+# id of the batch job the current thread or task is working on, if any
+current_job = ContextVar("current_job", default=None)
+
+# Counter adding up the calls and tokens of the LLM calls made by the
+# current task, when one is set
+call_usage = ContextVar("call_usage", default=None)
+
+
+def llm_name(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or "unknown"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Tracer:
+    """
+    Records one structured event per LLM call and per grid validation,
+    appending them to a JSONL file when a path is given and aggregating
+    them in memory for the end-of-run summary.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._file = open(path, "a") if path else None
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(list)
+        self._calls = defaultdict(Counter)
+        self._parse_outcomes = defaultdict(Counter)
+        self._retry_reasons = defaultdict(Counter)
+        self._validations = defaultdict(Counter)
+        self._jobs = defaultdict(Counter)
+
+    def emit(self, event_type, **fields):
+        event = {"type": event_type, "ts": time.time(), **fields}
+        if current_job.get() is not None:
+            event["job"] = current_job.get()
+        with self._lock:
+            self._aggregate(event)
+            if self._file:
+                self._file.write(json.dumps(event, default=str) + "\n")
+                self._file.flush()
+        return event
+
+    def _aggregate(self, event):
+        key = (event.get("model"), event.get("phase"))
+        if event.get("retry_reason"):
+            self._retry_reasons[key][event["retry_reason"]] += 1
+
+        if event["type"] == "llm_call":
+            self._latencies[key].append(event.get("latency_s", 0.0))
+            self._calls[key]["calls"] += 1
+            self._calls[key]["errors"] += 1 if event.get("error") else 0
+            self._calls[key]["cache_hits"] += 1 if event.get("cache_hit") else 0
+            self._calls[key]["structured"] += 1 if event.get("structured") else 0
+            self._calls[key]["parse_fallbacks"] += (
+                1 if event.get("parse_fallback") else 0
+            )
+            self._calls[key]["input_tokens"] += event.get("input_tokens") or 0
+            self._calls[key]["output_tokens"] += event.get("output_tokens") or 0
+            self._parse_outcomes[key][event.get("parse_outcome", "unknown")] += 1
+            if event.get("job") is not None:
+                job = self._jobs[event["job"]]
+                job["calls"] += 1
+                job["input_tokens"] += event.get("input_tokens") or 0
+                job["output_tokens"] += event.get("output_tokens") or 0
+        elif event["type"] == "grid_validation":
+            outcome = event.get("outcome")
+            if event.get("reason"):
+                outcome = f"{outcome}:{event['reason']}"
+            self._validations[key][outcome] += 1
+
+    def summary(self):
+        with self._lock:
+            rows = []
+            for key in sorted(self._calls, key=str):
+                model, phase = key
+                latencies = self._latencies[key]
+                outcomes = self._parse_outcomes[key]
+                calls = self._calls[key]
+                parse_failures = (
+                    calls["calls"] - outcomes["ok"] - outcomes["cancelled"]
+                )
+                rows.append(
+                    {
+                        "model": model,
+                        "phase": phase,
+                        "calls": calls["calls"],
+                        "errors": calls["errors"],
+                        "cache_hits": calls["cache_hits"],
+                        "latency_total_s": sum(latencies),
+                        "latency_p50_s": percentile(latencies, 0.5),
+                        "latency_p95_s": percentile(latencies, 0.95),
+                        "input_tokens": calls["input_tokens"],
+                        "output_tokens": calls["output_tokens"],
+                        "parse_failures": parse_failures,
+                        "parse_failure_rate": parse_failures / calls["calls"],
+                        "structured": calls["structured"],
+                        "parse_fallbacks": calls["parse_fallbacks"],
+                        "parse_outcomes": dict(outcomes),
+                        "retry_reasons": dict(self._retry_reasons[key]),
+                        "validations": dict(self._validations[key]),
+                    }
+                )
+            return rows
+
+    def parse_failure_rates(self):
+        """
+        Share of every model's calls, over all phases, whose response could
+        not be read.
+        """
+        calls = Counter()
+        failures = Counter()
+        for row in self.summary():
+            calls[row["model"]] += row["calls"]
+            failures[row["model"]] += row["parse_failures"]
+        return {model: failures[model] / calls[model] for model in calls}
+
+    def job_totals(self, job):
+        """
+        LLM calls and input/output tokens recorded for one batch job.
+        """
+        with self._lock:
+            return dict(self._jobs.get(job, {}))
+
+    def print_summary(self):
+        rows = self.summary()
+        print("\nTRACE SUMMARY:")
+        columns = [
+            "model",
+            "phase",
+            "calls",
+            "errors",
+            "cache_hits",
+            "latency_total_s",
+            "latency_p50_s",
+            "latency_p95_s",
+            "input_tokens",
+            "output_tokens",
+            "parse_failures",
+            "parse_failure_rate",
+            "parse_fallbacks",
+        ]
+        print(" | ".join(columns))
+        for row in rows:
+            print(
+                " | ".join(
+                    f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c])
+                    for c in columns
+                )
+            )
+        print("\nPARSE FAILURE RATE PER MODEL:")
+        for model, rate in self.parse_failure_rates().items():
+            print(f"{model}: {rate:.1%}")
+        for row in rows:
+            if row["retry_reasons"] or row["validations"]:
+                print(
+                    f"{row['model']} {row['phase']} - retry reasons: "
+                    f"{row['retry_reasons']}, validations: {row['validations']}"
+                )
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class NullTracer(Tracer):
+    def emit(self, event_type, **fields):
+        return None
+
+
+_tracer = NullTracer()
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def trace_llm_call(llm, phase, messages):
+    """
+    Times an LLM call and emits it as an llm_call event. The caller fills in
+    the yielded event with the response and its parse outcome.
+    """
+    event = {
+        "model": llm_name(llm),
+        "phase": phase,
+        "input_tokens": count_message_tokens(messages),
+    }
+    started_at = time.perf_counter()
+    try:
+        yield event
+    except asyncio.CancelledError:
+        event["parse_outcome"] = "cancelled"
+        raise
+    except Exception as e:
+        event["error"] = f"{type(e).__name__}: {e}"
+        event.setdefault("parse_outcome", "error")
+        raise
+    finally:
+        event["latency_s"] = time.perf_counter() - started_at
+        _tracer.emit("llm_call", **event)
+        usage = call_usage.get()
+        if usage is not None:
+            usage["calls"] += 1
+            usage["input_tokens"] += event.get("input_tokens") or 0
+            usage["output_tokens"] += event.get("output_tokens") or 0
+
+
+def record_response(event, response):
+    usage = getattr(response, "usage_metadata", None) or {}
+    event["input_tokens"] = usage.get("input_tokens", event.get("input_tokens"))
+    event["output_tokens"] = usage.get("output_tokens") or count_tokens(
+        response.content
+    )
+    if response.response_metadata.get("cache_hit"):
+        event["cache_hit"] = True
+
+
+def trace_validation(llm, phase, word_d, outcome, reason=None):
+    _tracer.emit(
+        "grid_validation",
+        model=llm_name(llm),
+        phase=phase,
+        word=word_d.get("word"),
+        row=word_d.get("row"),
+        column=word_d.get("column"),
+        isAcross=word_d.get("isAcross"),
+        outcome=outcome,
+        reason=reason,
+    )
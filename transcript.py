@@ -0,0 +1,261 @@
+import asyncio
+import gzip
+import json
+import threading
+import zlib
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from cache import cache_key, render_messages
+
+# the transcript the LLM calls and pipeline events of the current run or
+# batch job are recorded to, or replayed from
+current_transcript = ContextVar("current_transcript", default=None)
+
+
+class TranscriptMiss(Exception):
+    def __init__(self, model):
+        self.model = model
+        super().__init__(f"TRANSCRIPT MISS - Model: {model}: request not in the transcript")
+
+
+class ReplayedError(Exception):
+    """
+    An error a recorded LLM call raised, raised again on replay.
+    """
+
+
+def call_key(model, messages, schema=None):
+    return cache_key({"model": model}, messages, schema)
+
+
+def transcript_event(record_type, **fields):
+    transcript = current_transcript.get()
+    if transcript is not None:
+        transcript.record(record_type, **fields)
+
+
+class TranscriptWriter:
+    """
+    Gzipped JSONL transcript of one run: every LLM call with its prompt and
+    response, and the pipeline events generate_crossword records (the run
+    settings, the crossword handed to the solvers and the scores of every
+    iteration), in the order they happened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt")
+
+    def record(self, record_type, **fields):
+        line = json.dumps({"type": record_type, **fields}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def call(self, model, messages, schema=None, response=None, error=None):
+        fields = {
+            "model": model,
+            "key": call_key(model, messages, schema),
+            "prompt": render_messages(messages),
+        }
+        if schema is not None:
+            fields["schema"] = schema.__name__
+        if error is not None:
+            fields["error"] = f"{type(error).__name__}: {error}"
+        else:
+            fields["content"] = response.content
+            usage = getattr(response, "usage_metadata", None)
+            if usage:
+                fields["usage"] = dict(usage)
+        self.record("call", **fields)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_records(path):
+    records = []
+    with gzip.open(path, "rt") as f:
+        try:
+            for line in f:
+                records.append(json.loads(line))
+        except (EOFError, zlib.error, json.JSONDecodeError):
+            # the end of a transcript whose run died
+            pass
+    return records
+
+
+class Transcript:
+    """
+    A recorded transcript being replayed. Every request is answered with the
+    next unused response recorded for the same model, prompt and schema, and
+    the events of the replayed run are collected in `events`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = load_records(path)
+        self.events = []
+        self.misses = 0
+        self._calls = defaultdict(deque)
+        self._lock = threading.Lock()
+        for record in self.records:
+            if record["type"] == "call":
+                self._calls[record["key"]].append(record)
+
+    def of_type(self, record_type):
+        return [record for record in self.records if record["type"] == record_type]
+
+    def run(self):
+        runs = self.of_type("run")
+        return runs[0] if runs else None
+
+    def record(self, record_type, **fields):
+        event = json.loads(json.dumps({"type": record_type, **fields}, default=str))
+        with self._lock:
+            self.events.append(event)
+
+    def next_call(self, model, messages, schema=None):
+        with self._lock:
+            calls = self._calls.get(call_key(model, messages, schema))
+            if not calls:
+                self.misses += 1
+                return None
+            return calls.popleft()
+
+
+class RecordingLLM:
+    """
+    Wraps a chat model so every call made while a transcript is being
+    recorded is added to it, including the part of a stream that was read
+    before it was closed.
+    """
+
+    def __init__(self, llm, config):
+        self.llm = llm
+        self.config = config
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _record(self, input, schema=None, response=None, error=None):
+        transcript = current_transcript.get()
+        if isinstance(transcript, TranscriptWriter):
+            transcript.call(self.config["model"], input, schema, response, error)
+
+    def invoke(self, input, *args, **kwargs):
+        try:
+            response = self.llm.invoke(input, *args, **kwargs)
+        except Exception as e:
+            self._record(input, kwargs.get("schema"), error=e)
+            raise
+        self._record(input, kwargs.get("schema"), response)
+        return response
+
+    async def ainvoke(self, input, *args, **kwargs):
+        try:
+            response = await self.llm.ainvoke(input, *args, **kwargs)
+        except Exception as e:
+            self._record(input, kwargs.get("schema"), error=e)
+            raise
+        self._record(input, kwargs.get("schema"), response)
+        return response
+
+    def stream(self, input, *args, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        content = ""
+        try:
+            for chunk in self.llm.stream(input, *args, **kwargs):
+                content += chunk.content
+                yield chunk
+        finally:
+            self._record(input, response=AIMessage(content=content))
+
+    async def astream(self, input, *args, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        content = ""
+        try:
+            async for chunk in self.llm.astream(input, *args, **kwargs):
+                content += chunk.content
+                yield chunk
+        finally:
+            self._record(input, response=AIMessage(content=content))
+
+
+class ReplayLLM:
+    """
+    Stands in for a chat model while replaying, answering from the current
+    transcript. Requests the transcript has no response for raise
+    TranscriptMiss, which the pipeline handles like any failed call.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.model = config["model"]
+
+    def _replay(self, input, schema=None):
+        transcript = current_transcript.get()
+        call = transcript.next_call(self.model, input, schema) if transcript else None
+        if call is None:
+            raise TranscriptMiss(self.model)
+        if "error" in call:
+            raise ReplayedError(call["error"])
+        return call["content"], call.get("usage")
+
+    def invoke(self, input, *args, schema=None, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        content, usage = self._replay(input, schema)
+        return AIMessage(content=content, usage_metadata=usage)
+
+    async def ainvoke(self, input, *args, schema=None, **kwargs):
+        # yield like a real request would, so concurrent callers build their
+        # prompts from the same state they did when recording
+        await asyncio.sleep(0)
+        return self.invoke(input, schema=schema)
+
+    def stream(self, input, *args, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+
+        content, _ = self._replay(input)
+        yield AIMessageChunk(content=content)
+
+    async def astream(self, input, *args, **kwargs):
+        await asyncio.sleep(0)
+        from langchain_core.messages import AIMessageChunk
+
+        content, _ = self._replay(input)
+        yield AIMessageChunk(content=content)
+
+
+_recording = False
+_replaying = False
+
+
+def set_transcript_recording(enabled):
+    """
+    Wraps every client get_llm builds from now on in a RecordingLLM.
+    """
+    global _recording
+    _recording = enabled
+
+
+def set_replaying(enabled):
+    """
+    Makes get_llm build ReplayLLMs instead of provider clients.
+    """
+    global _replaying
+    _replaying = enabled
+
+
+def replaying():
+    return _replaying
+
+
+def wrap_with_transcript(llm, config):
+    if not _recording:
+        return llm
+    return RecordingLLM(llm, config)
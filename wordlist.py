@@ -0,0 +1,98 @@
+from collections import defaultdict
+from functools import lru_cache
+
+DEFAULT_WORDLIST_PATH = "configs/wordlist.txt"
+
+# solver config model name of the LLM-free baseline solver
+WORDLIST_SOLVER_MODEL = "wordlist"
+
+
+class WordIndex:
+    """
+    Wordlist indexed by length and by (position, letter), where each
+    (length, position, letter) maps to a bitset over the words of that
+    length, so a slot pattern is answered by AND-ing one bitset per fixed
+    letter.
+    """
+
+    def __init__(self, words):
+        self.words_by_length = defaultdict(list)
+        for word in sorted({word.strip().lower() for word in words}):
+            if word.isalpha():
+                self.words_by_length[len(word)].append(word)
+
+        self.masks = {}
+        for length, words in self.words_by_length.items():
+            bits = defaultdict(lambda: bytearray((len(words) + 7) // 8))
+            for i, word in enumerate(words):
+                for position, letter in enumerate(word):
+                    bits[(position, letter)][i // 8] |= 1 << (i % 8)
+            for (position, letter), bitset in bits.items():
+                self.masks[(length, position, letter)] = int.from_bytes(
+                    bitset, "little"
+                )
+
+    def __len__(self):
+        return sum(len(words) for words in self.words_by_length.values())
+
+    def _mask(self, length, pattern):
+        mask = (1 << len(self.words_by_length.get(length, []))) - 1
+        for position, letter in enumerate(pattern or ""):
+            if letter != "?":
+                mask &= self.masks.get((length, position, letter), 0)
+                if not mask:
+                    break
+        return mask
+
+    def count(self, length, pattern=None):
+        return bin(self._mask(length, pattern)).count("1")
+
+    def candidates(self, length, pattern=None, limit=None):
+        """
+        Words of the given length matching the pattern, where '?' marks a
+        free cell, in wordlist order.
+        """
+        words = self.words_by_length.get(length, [])
+        mask = self._mask(length, pattern)
+        matches = []
+        while mask and (limit is None or len(matches) < limit):
+            lowest = mask & -mask
+            matches.append(words[lowest.bit_length() - 1])
+            mask ^= lowest
+        return matches
+
+
+@lru_cache(maxsize=None)
+def load_word_index(path=DEFAULT_WORDLIST_PATH):
+    """
+    Builds the index of a wordlist file with one word per line; blank lines,
+    lines starting with '#' and entries with non-letters are skipped.
+    """
+    with open(path, "r") as f:
+        return WordIndex(line for line in f if not line.startswith("#"))
+
+
+def slot_pattern(grid, clue):
+    """
+    The characters already placed in a clue's cells, with '?' for empty ones.
+    """
+    word_d = {
+        "word": "?" * clue["length"],
+        "row": clue["row"],
+        "column": clue["column"],
+        "isAcross": clue["across"],
+    }
+    return "".join(
+        (grid.get(row, column) if grid.in_bounds(row, column) else None) or "?"
+        for row, column in grid.cell_positions(word_d)
+    )
+
+
+def clue_word_dict(clue, word):
+    return {
+        "word": word,
+        "row": clue["row"],
+        "column": clue["column"],
+        "isAcross": clue["across"],
+        "clue": clue["clue"],
+    }